@@ -26,6 +26,8 @@ admin
 configuration for the Django admin
 """
 
+from datetime import datetime
+
 from django.db import models
 from django.contrib import admin
 from django.core import urlresolvers
@@ -35,7 +37,7 @@ from django.utils.translation import ugettext_lazy as _
 from django.http import HttpResponseRedirect
 from django.contrib.sites.models import Site
 import django.forms
-from django.contrib.auth import load_backend
+from django.contrib.admin.views.main import ChangeList
 
 from mptt_tree_editor.admin import TreeEditor
 
@@ -48,6 +50,7 @@ from cyclope.forms import (MenuItemAdminForm, SiteSettingsAdminForm,
 from cyclope.widgets import get_default_text_widget
 from cyclope.core.collections.admin import CollectibleAdmin
 from cyclope.core.collections.models import Category
+from cyclope.core.perms.backends import filter_by_perm
 import cyclope.settings as cyc_settings
 from cyclope.utils import PermanentFilterMixin
 from cyclope.signals import admin_post_create
@@ -66,6 +69,16 @@ class RelatedContentInline(generic.GenericStackedInline):
     extra = 0
 
 
+class PermissionChangeList(ChangeList):
+    """
+    A ChangeList of the content objects that the user is granted edit perms
+    through category and collection permissions (row based perms).
+    """
+    def get_query_set(self, request):
+        query_set = super(PermissionChangeList, self).get_query_set(request)
+        return filter_by_perm(request.user, query_set, 'edit_content')
+
+
 class BaseContentAdmin(admin.ModelAdmin):
     """Base class for content models to use instead of admin.ModelAdmin
     """
@@ -101,27 +114,8 @@ class BaseContentAdmin(admin.ModelAdmin):
         return super(BaseContentAdmin, self).change_view(request, object_id,
                                                           form_url, extra_context)
 
-    def changelist_view(self, request, extra_context=None):
-        cat_perm_backend = load_backend('cyclope.core.perms.backends.CategoryPermBackend')
-        response = super(BaseContentAdmin, self).changelist_view(request, extra_context)
-        u = request.user
-        # row based perms.
-        # only return content objects for which user is granted edit perms
-        if not (u.is_authenticated() and (u.is_superuser or
-           u.is_staff and u.has_perm('collections.change_category'))):
-            cl = response.context_data["cl"]
-            query_set = cl.query_set._clone()
-            forbidden = []
-            for content_object in query_set:
-                if not cat_perm_backend.has_perm(u, "edit_content", content_object):
-                    forbidden.append(content_object.pk)
-            ## TODO(nicoechaniz): there might be a way to achieve this without repeating this steps from ChangeList view. Investigate and refactor if possible.
-            new_query_set = query_set.exclude(id__in=forbidden)
-            cl.query_set = new_query_set
-            cl.get_results(request)
-            response.context_data["cl"] = cl
-
-        return response
+    def get_changelist(self, request, **kwargs):
+        return PermissionChangeList
 
     def add_view(self, request, form_url='', extra_context=None):
         if '_frontend' in request.REQUEST:
@@ -184,7 +178,7 @@ class RegionViewInline(admin.StackedInline):
 
 ####################################
 from cyclope.models import SiteSettings
-from cyclope.themes import get_theme
+from cyclope.utils import get_page_context
 class LayoutAdmin(admin.ModelAdmin):
     form = LayoutAdminForm
     inlines = (RegionViewInline, )
@@ -193,7 +187,7 @@ class LayoutAdmin(admin.ModelAdmin):
     # get current Layout's regions ordered by weight
     # overrides change_view TODO(NumericA) django > 1.4  must override get_context_data instead?
     def change_view(self, request, object_id, form_url='', extra_context=None):
-        theme_settings = get_theme(SiteSettings.objects.get().theme)
+        theme_settings = get_page_context(request).theme
         layout_template = Layout.objects.get(pk=object_id).template
         layout_regions = theme_settings.layout_templates[layout_template]['regions']
         layout_regions = sorted(layout_regions.items(), key=lambda x: x[1]['weight'])
@@ -275,6 +269,23 @@ admin.site.register(Author, AuthorAdmin)
 
 admin.site.register(Source)
 
+class QueuedMailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipients', 'status', 'attempts',
+                    'next_attempt', 'creation_date')
+    list_filter = ('status',)
+    readonly_fields = ('subject', 'recipients', 'status', 'attempts',
+                       'next_attempt', 'last_error', 'creation_date')
+    actions = ['retry']
+
+    def has_add_permission(self, request):
+        return False
+
+    def retry(self, request, queryset):
+        queryset.update(status='queued', attempts=0, next_attempt=datetime.now())
+    retry.short_description = _('Send the selected mails again')
+
+admin.site.register(QueuedMail, QueuedMailAdmin)
+
 class SiteAdmin(admin.ModelAdmin):
     list_display = ('domain', 'name')
     search_fields = ('domain', 'name')
@@ -21,10 +21,11 @@
 
 from haystack.indexes import *
 from haystack import site
+from cyclope.search_indexes import QueuedSearchIndex
 import cyclope.apps.articles.models
 
 
-class ArticleIndex(RealTimeSearchIndex):
+class ArticleIndex(QueuedSearchIndex):
     text = CharField(document=True, use_template=True) #template: pretitle, summary, text, author, source
     author = CharField(model_attr='author', null=True)
     source = CharField(model_attr='source', null=True)
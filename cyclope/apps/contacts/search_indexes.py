@@ -21,10 +21,11 @@
 
 from haystack.indexes import *
 from haystack import site
+from cyclope.search_indexes import QueuedSearchIndex
 from models import Contact
 
 
-class ContactIndex(RealTimeSearchIndex):
+class ContactIndex(QueuedSearchIndex):
     text = CharField(document=True, use_template=True)
     given_name = CharField(model_attr='given_name')
     surname = CharField(model_attr='surname')
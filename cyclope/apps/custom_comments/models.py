@@ -63,7 +63,9 @@ class CustomComment(ThreadedComment):
         comments = CustomComment.objects.filter(id=self.root_path, subscribe=True)
         if comments:
             messages = [(subject, message, settings.DEFAULT_FROM_EMAIL, [comment.userinfo["email"]]) for comment in comments]
-            send_mass_mail(messages, fail_silently=True)
+            from cyclope import mail_queue
+            send_mass_mail(messages, fail_silently=True,
+                           connection=mail_queue.get_connection())
 
     class Meta:
         verbose_name = _("comment")
@@ -20,7 +20,9 @@ from django.contrib.comments.models import CommentFlag
 moderator.register(Site, CustomCommentModerator)
 
 from cyclope.utils import get_singleton
-from cyclope.models import SiteSettings
+from cyclope.models import SiteSettings, QueuedMail
+from cyclope.mail_queue import send_queued_mail
+import cyclope.settings as cyc_settings
 
 class CustomCommentTest(TestCase):
 
@@ -37,7 +39,7 @@ class CustomCommentTest(TestCase):
         custom_comment_models.moderation_enabled = lambda :False
         comment = self.create_comment()
         # mail sent to moderators only
-        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(len(self.sent_mail()), 1)
         self.assertTrue("New comment posted on '%s'" % self.site in mail.outbox[0].subject)
         other_comment = self.create_comment()
 
@@ -45,23 +47,23 @@ class CustomCommentTest(TestCase):
                               content_object=self.site, site=self.site, subscribe=True)
         reply.save()
         # mail sent to moderators and to original author of first comment
-        self.assertEqual(len(mail.outbox), 4) # 2 admin-new, 1 reply-admin + 1 reply-suscriptor 
+        self.assertEqual(len(self.sent_mail()), 4) # 2 admin-new, 1 reply-admin + 1 reply-suscriptor 
         self.assertEqual(mail.outbox[3].to[0], "san@test.com") # reply-admin 
 
     #MAIL
     def test_no_moderation_admin_mailed(self):
         custom_comment_models.moderation_enabled = lambda :False
         comment = self.create_comment()
-        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(len(self.sent_mail()), 1)
     
     def test_moderation_admin_mailed(self):
         comment = self.create_comment()
-        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(len(self.sent_mail()), 1)
     
     def test_no_moderation_sucriptor_mails_sent(self): # FIXME not_sent
         custom_comment_models.moderation_enabled = lambda :False
         comment = self.create_comment()
-        self.assertEqual(len(mail.outbox), 1) # 1 to admin
+        self.assertEqual(len(self.sent_mail()), 1) # 1 to admin
         reply = CustomComment(
             name="Numerica", 
             email="webmaster@numerica.cl", 
@@ -71,7 +73,7 @@ class CustomCommentTest(TestCase):
             subscribe=True
         )
         reply.save()
-        self.assertEqual(len(mail.outbox), 3) # 2 to admin, 1 to suscriptor
+        self.assertEqual(len(self.sent_mail()), 3) # 2 to admin, 1 to suscriptor
         reply_2 = CustomComment(
             name="Numerica", 
             email="roberto@numerica.cl", 
@@ -81,7 +83,7 @@ class CustomCommentTest(TestCase):
             subscribe=True
         )
         reply_2.save()
-        self.assertEqual(len(mail.outbox), 5) # 3 to admin, 2 to suscriptor
+        self.assertEqual(len(self.sent_mail()), 5) # 3 to admin, 2 to suscriptor
         
     def test_moderation_suscriptor_mail_delayed(self):
         comment = self.create_comment()
@@ -94,7 +96,7 @@ class CustomCommentTest(TestCase):
             subscribe=True
         )
         reply.save()
-        self.assertEqual(len(mail.outbox), 2) # 2 to admin, 0 to suscriptor 
+        self.assertEqual(len(self.sent_mail()), 2) # 2 to admin, 0 to suscriptor 
     
     def test_moderation_suscriptor_mail_approved_sent(self):
         custom_comment_models.moderation_enabled = lambda :True
@@ -110,7 +112,7 @@ class CustomCommentTest(TestCase):
             subscribe=True
         )
         reply.save()
-        self.assertEqual(len(mail.outbox), 2) # 2 to admin, 0 to suscriptor 
+        self.assertEqual(len(self.sent_mail()), 2) # 2 to admin, 0 to suscriptor 
         # COMMENT APPROVAL
         # django_comments.views.moderation.perform_approve
         request = RequestFactory().get('/')
@@ -131,7 +133,83 @@ class CustomCommentTest(TestCase):
             created = created,
             request = request
         )
-        self.assertEqual(len(mail.outbox), 3) # 2 to admin, 1 to suscriptor 
+        self.assertEqual(len(self.sent_mail()), 3) # 2 to admin, 1 to suscriptor 
+
+    def test_notifications_are_queued(self):
+        self.create_comment()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(QueuedMail.objects.count(), 1)
+        self.assertEqual(send_queued_mail()['sent'], 1)
+        self.assertEqual(QueuedMail.objects.count(), 0)
+        self.assertTrue("New comment posted on" in mail.outbox[0].subject)
+
+    def test_queued_mail_retry(self):
+        class FailingConnection(object):
+            def open(self):
+                pass
+            def close(self):
+                pass
+            def send_messages(self, messages):
+                raise IOError("connection refused")
+
+        self.create_comment()
+        queued = QueuedMail.objects.get()
+        for attempt in range(cyc_settings.CYCLOPE_MAIL_MAX_ATTEMPTS):
+            QueuedMail.objects.update(next_attempt=queued.creation_date)
+            stats = send_queued_mail(connection=FailingConnection())
+        self.assertEqual(stats['failed'], 1)
+        queued = QueuedMail.objects.get()
+        self.assertEqual(queued.status, 'failed')
+        self.assertTrue('connection refused' in queued.last_error)
+        # failed mails are not sent again
+        self.assertEqual(send_queued_mail()['sent'], 0)
+
+    def test_queued_mail_smtp_sink(self):
+        import smtpd
+        import asyncore
+        import threading
+        from cyclope import mail_queue
+
+        sessions, received = [], []
+        class SMTPSink(smtpd.SMTPServer):
+            def handle_accept(self):
+                sessions.append(True)
+                smtpd.SMTPServer.handle_accept(self)
+            def process_message(self, peer, mailfrom, rcpttos, data):
+                received.append(rcpttos)
+
+        sink = SMTPSink(('127.0.0.1', 0), None)
+        port = sink.socket.getsockname()[1]
+        loop = threading.Thread(target=asyncore.loop, kwargs={'timeout': 0.05})
+        loop.daemon = True
+        loop.start()
+        try:
+            for n in range(3):
+                mail_queue.enqueue(mail.EmailMessage('Queued %d' % n, 'body',
+                                   'from@example.com', ['to%d@example.com' % n]))
+            connection = mail.get_connection('django.core.mail.backends.smtp.EmailBackend',
+                                             host='127.0.0.1', port=port)
+            self.assertEqual(send_queued_mail(connection=connection)['sent'], 3)
+        finally:
+            sink.close()
+            loop.join(5)
+        self.assertEqual(sorted(received),
+                         [['to0@example.com'], ['to1@example.com'], ['to2@example.com']])
+        # the whole batch went over one SMTP session
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(QueuedMail.objects.count(), 0)
+
+    def test_queued_mail_unreachable_server(self):
+        class UnreachableConnection(object):
+            def open(self):
+                raise IOError("connection refused")
+
+        self.create_comment()
+        stats = send_queued_mail(connection=UnreachableConnection())
+        self.assertEqual(stats, {'sent': 0, 'retried': 0, 'failed': 0})
+        queued = QueuedMail.objects.get()
+        self.assertEqual((queued.status, queued.attempts), ('queued', 0))
+        self.assertEqual(send_queued_mail()['sent'], 1)
 
     def test_needs_moderation(self):
         custom_comment_models.moderation_enabled = lambda :False
@@ -177,3 +255,6 @@ class CustomCommentTest(TestCase):
         comment.save()
         return comment
 
+    def sent_mail(self):
+        send_queued_mail()
+        return mail.outbox
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010-2013 Código Sur Sociedad Civil.
+# All rights reserved.
+#
+# This file is part of Cyclope.
+#
+# Cyclope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Cyclope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+apps.feeds.fetcher
+------------------
+
+Fetches remote feeds outside of the request and keeps the parsed entries in
+the shared cache, so every process serves the same stored copy.
+
+Remote feeds are requested with conditional GETs and a timeout. When a fetch
+fails the previous copy keeps being served.
+"""
+
+import socket
+import hashlib
+import httplib
+import logging
+import urllib2
+import threading
+from datetime import datetime, timedelta
+from multiprocessing.pool import ThreadPool
+
+from django.core.cache import cache
+import feedparser
+
+from cyclope import settings as cyc_settings
+
+logger = logging.getLogger(__name__)
+
+# stored copies outlive CYCLOPE_FEED_CACHE_TIME so they can be served stale
+STORE_TIMEOUT = 60*60*24*30
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPool(cyc_settings.CYCLOPE_FEED_FETCH_THREADS)
+    return _pool
+
+def _cache_key(url, prefix='cyclope_feed'):
+    return '%s_%s' % (prefix, hashlib.md5(url.encode('utf-8')).hexdigest())
+
+def get_stored_feed(url):
+    """
+    Returns the stored copy of the feed, a dict with its 'entries', or None
+    if it hasn't been fetched yet.
+    """
+    return cache.get(_cache_key(url))
+
+def is_stale(stored):
+    if stored is None:
+        return True
+    max_age = timedelta(seconds=cyc_settings.CYCLOPE_FEED_CACHE_TIME)
+    return datetime.now() - stored['checked'] > max_age
+
+def fetch_feed(url, timeout=None):
+    """
+    Fetches the feed and stores the parsed copy. A fetch that fails or isn't
+    modified keeps the previous entries.
+
+    Returns the stored copy.
+    """
+    key = _cache_key(url)
+    stored = cache.get(key) or {'entries': [], 'etag': None, 'modified': None,
+                                'fetched': None}
+    request = urllib2.Request(url, headers={'User-Agent': feedparser.USER_AGENT})
+    if stored['etag']:
+        request.add_header('If-None-Match', stored['etag'])
+    if stored['modified']:
+        request.add_header('If-Modified-Since', stored['modified'])
+    timeout = timeout or cyc_settings.CYCLOPE_FEED_FETCH_TIMEOUT
+    try:
+        response = urllib2.urlopen(request, timeout=timeout)
+        data = response.read()
+    except urllib2.HTTPError, e:
+        if e.code != 304:
+            logger.warning("Error %s fetching feed %s", e.code, url)
+    except (urllib2.URLError, httplib.HTTPException, socket.error, ValueError), e:
+        logger.warning("Error fetching feed %s: %s", url, e)
+    else:
+        parsed = feedparser.parse(data, response_headers={'content-location': url})
+        if parsed.bozo and not parsed.entries:
+            logger.warning("Invalid feed %s: %s", url, parsed.get('bozo_exception'))
+        else:
+            stored.update({'entries': parsed.entries,
+                           'etag': response.headers.get('ETag'),
+                           'modified': response.headers.get('Last-Modified'),
+                           'fetched': datetime.now()})
+    stored['checked'] = datetime.now()
+    cache.set(key, stored, STORE_TIMEOUT)
+    return stored
+
+def _refresh(url):
+    try:
+        fetch_feed(url)
+    except Exception:
+        logger.exception("Error refreshing feed %s", url)
+    finally:
+        cache.delete(_cache_key(url, 'cyclope_feed_lock'))
+
+def refresh_feed_async(url):
+    """
+    Fetches the feed in a background thread unless some process is already
+    fetching it.
+    """
+    lock_timeout = cyc_settings.CYCLOPE_FEED_FETCH_TIMEOUT * 2
+    if cache.add(_cache_key(url, 'cyclope_feed_lock'), True, lock_timeout):
+        _get_pool().apply_async(_refresh, (url,))
+
+def get_feed(url):
+    """
+    Returns the stored copy of the feed without waiting for the network. A
+    missing or stale copy is refreshed in the background.
+    """
+    stored = get_stored_feed(url)
+    if is_stale(stored):
+        refresh_feed_async(url)
+    return stored
+
+def refresh_feeds(urls):
+    """Fetches all the feeds concurrently and returns their stored copies."""
+    return _get_pool().map(fetch_feed, urls)
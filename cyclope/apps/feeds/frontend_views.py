@@ -19,21 +19,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from datetime import datetime
 from django import forms
 from django.utils.translation import ugettext_lazy as _
 
 from cyclope.core import frontend
 from cyclope import views
-from cyclope import settings as cyc_settings
-import feedparser
 
 from models import Feed
-
-# timedelta.total_seconds is new in python 2.7 http://docs.python.org/library/datetime.html
-# so we define an equivalent here for compatibility's sake
-def total_seconds(td):
-    return (td.microseconds + (td.seconds + td.days * 24 * 3600) * 10**6) / 10**6
+from fetcher import get_feed
 
 
 class FeedDetailOptions(forms.Form):
@@ -50,20 +43,16 @@ class FeedDetail(frontend.FrontendView):
     is_region_view = True
     options_form = FeedDetailOptions
 
-    _feed_cache = {}
-
     def get_response(self, request, req_context, options, content_object):
         if not options['limit_to_n_items']:
             options['limit_to_n_items'] = content_object.number_of_entries
         if not options['titles_only']:
             options['titles_only'] = content_object.titles_only
 
-        now = datetime.now()
-        d, last_access = self._feed_cache.get(content_object.url, (None, None))
-        if d is None or total_seconds(now - last_access) > cyc_settings.CYCLOPE_FEED_CACHE_TIME:
-            d = feedparser.parse(content_object.url)
-            self._feed_cache[content_object.url] = (d, now)
-        context = {'entries': d.entries[:options['limit_to_n_items']]}
+        # the feed is fetched in the background, until then there are no entries
+        feed = get_feed(content_object.url)
+        entries = feed['entries'] if feed else []
+        context = {'entries': entries[:options['limit_to_n_items']]}
         return views.object_detail(request, req_context, content_object,
                                    extra_context=context)
 
@@ -21,10 +21,11 @@
 
 from haystack.indexes import *
 from haystack import site
+from cyclope.search_indexes import QueuedSearchIndex
 import cyclope.apps.feeds.models
 
 
-class FeedIndex(RealTimeSearchIndex):
+class FeedIndex(QueuedSearchIndex):
     text = CharField(document=True, use_template=True) #template: name, summary
     url = CharField(model_attr='url', null=True)
 
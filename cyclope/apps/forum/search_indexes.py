@@ -21,10 +21,11 @@
 
 from haystack.indexes import *
 from haystack import site
+from cyclope.search_indexes import QueuedSearchIndex
 import cyclope.apps.forum.models
 
 
-class TopicIndex(RealTimeSearchIndex):
+class TopicIndex(QueuedSearchIndex):
     text = CharField(document=True, use_template=True) #template: text, author
     pub_date = DateTimeField(model_attr='creation_date')
 
@@ -21,10 +21,11 @@
 
 from haystack.indexes import *
 from haystack import site
+from cyclope.search_indexes import QueuedSearchIndex
 import cyclope.apps.medialibrary.models
 
 
-class BaseMediaIndex(RealTimeSearchIndex):
+class BaseMediaIndex(QueuedSearchIndex):
     text = CharField(document=True, use_template=True) #template: author, description
     author = CharField(model_attr='author', null=True)
 
@@ -26,6 +26,7 @@ from django.utils.translation import ugettext_lazy as _
 from mptt.forms import TreeNodeChoiceField
 
 from cyclope.apps.newsletter.models import Newsletter
+from cyclope.apps.newsletter.views import render_stats
 from cyclope.core.collections.models import Category
 from cyclope.models import SiteSettings
 from cyclope.core.frontend.sites import site
@@ -67,4 +68,10 @@ class NewsletterAdmin(admin.ModelAdmin):
                         'test_recipients', 'recipients', 'list_admin',)}),
     )
 
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        extra_context = extra_context or {}
+        extra_context['render_stats'] = render_stats()
+        return super(NewsletterAdmin, self).change_view(request, object_id,
+                                                        form_url, extra_context)
+
 admin.site.register(Newsletter, NewsletterAdmin)
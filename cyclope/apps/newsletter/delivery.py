@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010-2013 Código Sur Sociedad Civil.
+# All rights reserved.
+#
+# This file is part of Cyclope.
+#
+# Cyclope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Cyclope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Newsletter delivery
+-------------------
+
+The recipients of a NewsletterDelivery are mailed in batches over one
+connection, at most CYCLOPE_NEWSLETTER_RATE messages per second. Each
+recipient is marked as sent as soon as its message goes out, so an
+interrupted delivery resumes with the recipients that are still queued.
+"""
+
+import time
+import logging
+from datetime import datetime
+
+from django.core import mail
+from django.utils.encoding import force_unicode
+
+import cyclope.settings as cyc_settings
+from models import NewsletterDelivery, DeliveryRecipient
+
+logger = logging.getLogger(__name__)
+
+
+def _message(delivery, email):
+    msg = mail.EmailMessage(delivery.subject, delivery.html,
+                            delivery.from_address, [email])
+    msg.content_subtype = "html"
+    return msg
+
+def deliver_batch(delivery, batch_size=None, connection=None):
+    """
+    Mails the next batch of queued recipients of the delivery, and marks it
+    as done when none are left. Returns the number of messages sent.
+    """
+    batch_size = batch_size or cyc_settings.CYCLOPE_NEWSLETTER_BATCH_SIZE
+    recipients = list(delivery.recipients.filter(status='queued')
+                      .order_by('id')[:batch_size])
+    if not recipients:
+        delivery.status = 'done'
+        delivery.finish_date = datetime.now()
+        delivery.save()
+        if not delivery.test:
+            delivery.newsletter.last_sent_date = delivery.finish_date
+            delivery.newsletter.save()
+        return 0
+
+    rate = cyc_settings.CYCLOPE_NEWSLETTER_RATE
+    interval = 1.0 / rate if rate else 0
+    connection = connection or mail.get_connection()
+    opened, sent, last_send = False, 0, 0
+    try:
+        for recipient in recipients:
+            wait = last_send + interval - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            last_send = time.time()
+            if not opened:
+                try:
+                    connection.open()
+                except Exception, error:
+                    # the server is unreachable, the recipients aren't to
+                    # blame, try again in the next batch
+                    logger.warning("Error connecting to the mail server: %r", error)
+                    break
+                opened = True
+            try:
+                connection.send_messages([_message(delivery, recipient.email)])
+            except Exception, error:
+                recipient.attempts += 1
+                recipient.last_error = force_unicode(repr(error))
+                if recipient.attempts >= cyc_settings.CYCLOPE_MAIL_MAX_ATTEMPTS:
+                    recipient.status = 'failed'
+                recipient.save()
+                connection.close()
+                opened = False
+            else:
+                DeliveryRecipient.objects.filter(id=recipient.id).update(
+                    status='sent', sent_date=datetime.now())
+                sent += 1
+    finally:
+        if opened:
+            connection.close()
+    return sent
+
+def deliver_queued(batch_size=None):
+    """
+    Sends a batch of every queued delivery, oldest first. Returns the number
+    of messages sent.
+    """
+    sent = 0
+    for delivery in NewsletterDelivery.objects.filter(status='queued').order_by('id'):
+        sent += deliver_batch(delivery, batch_size)
+    return sent
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'NewsletterDelivery'
+        db.create_table('newsletter_newsletterdelivery', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('newsletter', self.gf('django.db.models.fields.related.ForeignKey')(related_name='deliveries', to=orm['newsletter.Newsletter'])),
+            ('test', self.gf('django.db.models.fields.BooleanField')(default=False)),
+            ('subject', self.gf('django.db.models.fields.CharField')(max_length=250)),
+            ('from_address', self.gf('django.db.models.fields.CharField')(max_length=255)),
+            ('html', self.gf('django.db.models.fields.TextField')()),
+            ('status', self.gf('django.db.models.fields.CharField')(default='queued', max_length=6, db_index=True)),
+            ('creation_date', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.now)),
+            ('finish_date', self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True)),
+        ))
+        db.send_create_signal('newsletter', ['NewsletterDelivery'])
+
+        # Adding model 'DeliveryRecipient'
+        db.create_table('newsletter_deliveryrecipient', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('delivery', self.gf('django.db.models.fields.related.ForeignKey')(related_name='recipients', to=orm['newsletter.NewsletterDelivery'])),
+            ('email', self.gf('django.db.models.fields.CharField')(max_length=255)),
+            ('status', self.gf('django.db.models.fields.CharField')(default='queued', max_length=6, db_index=True)),
+            ('attempts', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('last_error', self.gf('django.db.models.fields.TextField')(blank=True)),
+            ('sent_date', self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True)),
+        ))
+        db.send_create_signal('newsletter', ['DeliveryRecipient'])
+
+        # Adding unique constraint on 'DeliveryRecipient', fields ['delivery', 'email']
+        db.create_unique('newsletter_deliveryrecipient', ['delivery_id', 'email'])
+
+
+        # Changing field 'Newsletter.recipients'
+        db.alter_column('newsletter_newsletter', 'recipients', self.gf('django.db.models.fields.TextField')())
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'DeliveryRecipient', fields ['delivery', 'email']
+        db.delete_unique('newsletter_deliveryrecipient', ['delivery_id', 'email'])
+
+        # Deleting model 'NewsletterDelivery'
+        db.delete_table('newsletter_newsletterdelivery')
+
+        # Deleting model 'DeliveryRecipient'
+        db.delete_table('newsletter_deliveryrecipient')
+
+
+        # Changing field 'Newsletter.recipients'
+        db.alter_column('newsletter_newsletter', 'recipients', self.gf('django.db.models.fields.CharField')(max_length=255))
+
+    models = {
+        'collections.category': {
+            'Meta': {'unique_together': "(('collection', 'name'),)", 'object_name': 'Category'},
+            'active': ('django.db.models.fields.BooleanField', [], {'default': 'True', 'db_index': 'True'}),
+            'collection': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'categories'", 'to': "orm['collections.Collection']"}),
+            'description': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'image': ('filebrowser.fields.FileBrowseField', [], {'max_length': '250', 'blank': 'True'}),
+            'level': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'}),
+            'lft': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'parent': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'children'", 'null': 'True', 'to': "orm['collections.Category']"}),
+            'rght': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'}),
+            'slug': ('autoslug.fields.AutoSlugField', [], {'unique': 'True', 'max_length': '50', 'populate_from': 'None', 'unique_with': '()', 'blank': 'True'}),
+            'tree_id': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'})
+        },
+        'collections.collection': {
+            'Meta': {'object_name': 'Collection'},
+            'content_types': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['contenttypes.ContentType']", 'db_index': 'True', 'symmetrical': 'False'}),
+            'default_list_view': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '255', 'blank': 'True'}),
+            'description': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'image': ('filebrowser.fields.FileBrowseField', [], {'max_length': '250', 'blank': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '100'}),
+            'navigation_root': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'slug': ('autoslug.fields.AutoSlugField', [], {'unique_with': '()', 'max_length': '50', 'populate_from': 'None', 'blank': 'True'}),
+            'view_options': ('jsonfield.fields.JSONField', [], {'default': "'{}'"}),
+            'visible': ('django.db.models.fields.BooleanField', [], {'default': 'True'})
+        },
+        'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        'cyclope.layout': {
+            'Meta': {'object_name': 'Layout'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'image_path': ('django.db.models.fields.CharField', [], {'default': "'main.png'", 'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '50', 'db_index': 'True'}),
+            'slug': ('autoslug.fields.AutoSlugField', [], {'unique_with': '()', 'max_length': '50', 'populate_from': 'None'}),
+            'template': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        'newsletter.deliveryrecipient': {
+            'Meta': {'unique_together': "(('delivery', 'email'),)", 'object_name': 'DeliveryRecipient'},
+            'attempts': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'delivery': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'recipients'", 'to': "orm['newsletter.NewsletterDelivery']"}),
+            'email': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_error': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'sent_date': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'status': ('django.db.models.fields.CharField', [], {'default': "'queued'", 'max_length': '6', 'db_index': 'True'})
+        },
+        'newsletter.newsletter': {
+            'Meta': {'object_name': 'Newsletter'},
+            'content_category': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['collections.Category']"}),
+            'head_image': ('django.db.models.fields.files.ImageField', [], {'max_length': '100', 'null': 'True', 'blank': 'True'}),
+            'header': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_sent_date': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'layout': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['cyclope.Layout']"}),
+            'list_admin': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'}),
+            'n_contents_center': ('django.db.models.fields.IntegerField', [], {'default': '10'}),
+            'n_contents_lateral': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'n_contents_top': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '250'}),
+            'recipients': ('django.db.models.fields.TextField', [], {}),
+            'regions': ('django.db.models.fields.CharField', [], {'default': "'c'", 'max_length': '4'}),
+            'sender': ('django.db.models.fields.EmailField', [], {'max_length': '75'}),
+            'sender_name': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '40', 'blank': 'True'}),
+            'show_ToC': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'show_title': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'slug': ('autoslug.fields.AutoSlugField', [], {'unique_with': '()', 'max_length': '50', 'populate_from': 'None'}),
+            'test_recipients': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'view': ('django.db.models.fields.CharField', [], {'default': "'default'", 'max_length': '255'})
+        },
+        'newsletter.newsletterdelivery': {
+            'Meta': {'object_name': 'NewsletterDelivery'},
+            'creation_date': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'finish_date': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'from_address': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'html': ('django.db.models.fields.TextField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'newsletter': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'deliveries'", 'to': "orm['newsletter.Newsletter']"}),
+            'status': ('django.db.models.fields.CharField', [], {'default': "'queued'", 'max_length': '6', 'db_index': 'True'}),
+            'subject': ('django.db.models.fields.CharField', [], {'max_length': '250'}),
+            'test': ('django.db.models.fields.BooleanField', [], {'default': 'False'})
+        }
+    }
+
+    complete_apps = ['newsletter']
\ No newline at end of file
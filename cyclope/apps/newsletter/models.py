@@ -19,6 +19,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import re
 from datetime import datetime
 
 from django.db import models
@@ -26,7 +27,7 @@ from django.utils.translation import ugettext_lazy as _
 
 from autoslug.fields import AutoSlugField
 
-from cyclope.utils import slugify
+from cyclope.utils import slugify, prefetch_content_objects
 from cyclope.models import Layout
 from cyclope.core.collections.models import Category, Categorization
 
@@ -72,9 +73,8 @@ class Newsletter(models.Model):
     test_recipients = models.CharField(verbose_name=_('test recipients'), 
         help_text=_('comma separated list of test e-mail addresses'), 
         max_length=255)
-    recipients = models.CharField(verbose_name=_('recipients'), 
-        help_text=_('comma separated list of recipient e-mail addresses'), 
-        max_length=255)
+    recipients = models.TextField(verbose_name=_('recipients'),
+        help_text=_('comma separated list of recipient e-mail addresses'))
     list_admin = models.CharField(verbose_name=_('url list manager'), 
         help_text=_('creates a shortcut to the administrator of your mailing list (full url with http://)'), 
         max_length=255, blank=True)
@@ -83,8 +83,9 @@ class Newsletter(models.Model):
         return self.name
 
     def catz_by_region(self):
-        data = self.content_category.categorizations.all()
         t, c, l = self.n_contents_top, self.n_contents_center, self.n_contents_lateral
+        data = prefetch_content_objects(
+            self.content_category.categorizations.all()[:t+c+l])
         top, center, lateral = [], [], []
         if self.regions == "c":
             top, center, lateral = [], data[:c], []
@@ -99,3 +100,86 @@ class Newsletter(models.Model):
     class Meta:
         verbose_name = _('newsletter')
         verbose_name_plural = _('newsletters')
+
+
+def split_addresses(addresses):
+    """Returns the e-mail addresses of a comma separated list, without duplicates."""
+    seen, result = set(), []
+    for address in re.split(r'[,;\s]+', addresses):
+        if address and address.lower() not in seen:
+            seen.add(address.lower())
+            result.append(address)
+    return result
+
+
+class NewsletterDelivery(models.Model):
+    """A sending of a newsletter, delivered in batches by send_newsletters."""
+
+    STATUS = (('queued', _('queued')),
+              ('done', _('done')))
+
+    newsletter = models.ForeignKey(Newsletter, related_name='deliveries',
+                                   verbose_name=_('newsletter'))
+    test = models.BooleanField(_('test'), default=False)
+    subject = models.CharField(_('subject'), max_length=250)
+    from_address = models.CharField(_('from'), max_length=255)
+    # the rendered newsletter with its styles inlined
+    html = models.TextField()
+    status = models.CharField(_('status'), max_length=6, choices=STATUS,
+                              default='queued', db_index=True)
+    creation_date = models.DateTimeField(_('creation date'), default=datetime.now)
+    finish_date = models.DateTimeField(_('finish date'), null=True, blank=True)
+
+    def __unicode__(self):
+        return u'%s (%s)' % (self.subject, self.creation_date)
+
+    @classmethod
+    def create(cls, newsletter, html, test=False):
+        """Queues the delivery of the rendered newsletter to its recipients."""
+        if newsletter.sender_name:
+            from_address = "%s <%s>" % (newsletter.sender_name, newsletter.sender)
+        else:
+            from_address = newsletter.sender
+        delivery = cls.objects.create(newsletter=newsletter, test=test,
+                                      subject=newsletter.name, html=html,
+                                      from_address=from_address)
+        addresses = newsletter.test_recipients if test else newsletter.recipients
+        DeliveryRecipient.objects.bulk_create(
+            [DeliveryRecipient(delivery=delivery, email=email)
+             for email in split_addresses(addresses)])
+        return delivery
+
+    def progress(self):
+        """Returns the number of recipients in each status."""
+        counts = dict((status, 0) for status, name in DeliveryRecipient.STATUS)
+        rows = self.recipients.values_list('status').annotate(models.Count('id'))
+        counts.update(rows)
+        counts['total'] = sum(counts.values())
+        return counts
+
+    class Meta:
+        verbose_name = _('newsletter delivery')
+        verbose_name_plural = _('newsletter deliveries')
+        get_latest_by = 'creation_date'
+
+
+class DeliveryRecipient(models.Model):
+    STATUS = (('queued', _('queued')),
+              ('sent', _('sent')),
+              ('failed', _('failed')))
+
+    delivery = models.ForeignKey(NewsletterDelivery, related_name='recipients')
+    email = models.CharField(_('e-mail'), max_length=255)
+    status = models.CharField(_('status'), max_length=6, choices=STATUS,
+                              default='queued', db_index=True)
+    attempts = models.PositiveIntegerField(_('attempts'), default=0)
+    last_error = models.TextField(_('last error'), blank=True)
+    sent_date = models.DateTimeField(_('sent date'), null=True, blank=True)
+
+    def __unicode__(self):
+        return self.email
+
+    class Meta:
+        verbose_name = _('recipient')
+        verbose_name_plural = _('recipients')
+        unique_together = ('delivery', 'email')
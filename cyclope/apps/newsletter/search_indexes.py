@@ -21,10 +21,11 @@
 
 from haystack.indexes import *
 from haystack import site
+from cyclope.search_indexes import QueuedSearchIndex
 import cyclope.apps.newsletter.models
 
 
-class NewsletterIndex(RealTimeSearchIndex):
+class NewsletterIndex(QueuedSearchIndex):
     text = CharField(document=True, use_template=True) #template: content
 
 site.register(cyclope.apps.newsletter.models.Newsletter, NewsletterIndex)
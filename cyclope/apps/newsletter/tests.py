@@ -0,0 +1,89 @@
+from django.core import mail
+from django.test import TestCase
+
+from cyclope.core import frontend
+from cyclope.models import Layout
+from cyclope.core.collections.models import Collection, Category, Categorization
+from cyclope.apps.staticpages.models import StaticPage
+from models import Newsletter, NewsletterDelivery, split_addresses
+from delivery import deliver_batch, deliver_queued
+from views import _html_cache_key
+
+
+class FailingConnection(object):
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise IOError("connection refused")
+
+
+class UnreachableConnection(FailingConnection):
+    def open(self):
+        raise IOError("connection refused")
+
+
+class NewsletterDeliveryTestCase(TestCase):
+
+    fixtures = ['simplest_site.json']
+
+    def setUp(self):
+        frontend.autodiscover()
+        collection = Collection.objects.create(name='Newsletters')
+        category = Category.objects.create(name='Issue 1', collection=collection)
+        self.newsletter = Newsletter.objects.create(
+            name='Monthly', content_category=category,
+            layout=Layout.objects.all()[0], sender='news@example.com',
+            test_recipients='test@example.com',
+            recipients='a@example.com, b@example.com,\nc@example.com, a@example.com')
+
+    def test_split_addresses(self):
+        self.assertEqual(split_addresses(self.newsletter.recipients),
+                         ['a@example.com', 'b@example.com', 'c@example.com'])
+
+    def test_delivery(self):
+        delivery = NewsletterDelivery.create(self.newsletter, '<p>news</p>')
+        self.assertEqual(delivery.progress()['total'], 3)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(deliver_batch(delivery, batch_size=2), 2)
+        self.assertEqual(delivery.progress()['sent'], 2)
+        # a new batch only mails the remaining recipients
+        deliver_queued()
+        self.assertEqual([m.to for m in mail.outbox],
+                         [['a@example.com'], ['b@example.com'], ['c@example.com']])
+        deliver_queued()
+        delivery = NewsletterDelivery.objects.get(pk=delivery.pk)
+        self.assertEqual(delivery.status, 'done')
+        self.assertTrue(Newsletter.objects.get().last_sent_date)
+
+    def test_delivery_failure(self):
+        delivery = NewsletterDelivery.create(self.newsletter, '<p>news</p>', test=True)
+        self.assertEqual(deliver_batch(delivery, connection=FailingConnection()), 0)
+        recipient = delivery.recipients.get()
+        self.assertEqual(recipient.status, 'queued')
+        self.assertEqual(recipient.attempts, 1)
+        # an unreachable server doesn't count as an attempt
+        self.assertEqual(deliver_batch(delivery, connection=UnreachableConnection()), 0)
+        recipient = delivery.recipients.get()
+        self.assertEqual((recipient.status, recipient.attempts), ('queued', 1))
+        self.assertEqual(deliver_queued(), 1)
+        self.assertEqual(mail.outbox[0].to, ['test@example.com'])
+
+    def test_html_cache_key(self):
+        key = _html_cache_key(self.newsletter)
+        self.assertEqual(key, _html_cache_key(self.newsletter))
+        page = StaticPage.objects.create(name='Editorial')
+        Categorization.objects.create(category=self.newsletter.content_category,
+                                      content_object=page)
+        self.assertNotEqual(key, _html_cache_key(self.newsletter))
+        key = _html_cache_key(self.newsletter)
+        page.text = 'Updated'
+        page.save()
+        self.assertNotEqual(key, _html_cache_key(self.newsletter))
+        key = _html_cache_key(self.newsletter)
+        self.newsletter.header = 'New header'
+        self.assertNotEqual(key, _html_cache_key(self.newsletter))
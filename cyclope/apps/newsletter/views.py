@@ -1,23 +1,26 @@
+import os
+import time
 import logging
-from string import strip
 
 try:
     from premailer import Premailer
 except:
     pass
 
+from django.conf import settings
+from django.core.cache import cache
 from django.http import HttpResponse, HttpResponseRedirect
 from django.template import RequestContext
 from django.contrib.auth.decorators import permission_required
 from django.template import loader
-from django.core.mail import EmailMessage
 from django.core.urlresolvers import reverse
 from django.utils.translation import ugettext_lazy as _
 
 from cyclope.core import frontend
 from cyclope import settings as cyc_settings
 from cyclope.core.collections.models import Category
-from models import Newsletter
+from cyclope.utils import make_cache_key, CACHE_VERSION_TIMEOUT
+from models import Newsletter, NewsletterDelivery
 
 
 def _newsletter_html(request, newsletter):
@@ -38,10 +41,65 @@ def _newsletter_html(request, newsletter):
     return html
 
 
-@permission_required('newsletter.change_newsletter')
-def preview(request, id):
-    newsletter = Newsletter.objects.get(id=id)
-
+def _template_path(name):
+    for loader_name in settings.TEMPLATE_LOADERS:
+        template_loader = loader.find_template_loader(loader_name)
+        for source_loader in getattr(template_loader, 'loaders', [template_loader]):
+            sources = getattr(source_loader, 'get_template_sources', lambda name: [])
+            for path in sources(name):
+                if os.path.isfile(path):
+                    return path
+
+def _template_mtimes(template_names):
+    paths = filter(None, map(_template_path, template_names))
+    return [os.path.getmtime(path) for path in paths]
+
+def _html_cache_key(newsletter):
+    """
+    Builds the cache key of the inlined newsletter from its fields, the
+    categorizations of its category with the modification dates of their
+    contents and the modification times of the templates used to render it.
+    """
+    fields = [getattr(newsletter, field.attname) for field in newsletter._meta.fields
+              if field.name != 'last_sent_date']
+    categorizations = list(newsletter.content_category.categorizations.values_list(
+        'id', 'order', 'object_modification_date'))
+    templates = [cyc_settings.CYCLOPE_THEME_PREFIX + newsletter.layout.template,
+                 cyc_settings.CYCLOPE_THEME_BASE_TEMPLATE,
+                 frontend.site.get_view(Newsletter, newsletter.view).template]
+    return make_cache_key('newsletter_html', cyc_settings.CYCLOPE_CURRENT_THEME,
+                          fields, categorizations, _template_mtimes(templates))
+
+RENDER_STATS = ('newsletter_renders', 'newsletter_render_ms', 'newsletter_hits')
+
+def _incr(key, delta=1):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, delta, CACHE_VERSION_TIMEOUT)
+
+def render_stats():
+    """Returns the number of renders and cache hits of inlined newsletters."""
+    stats = cache.get_many(RENDER_STATS)
+    renders = stats.get('newsletter_renders', 0)
+    render_time = stats.get('newsletter_render_ms', 0)
+    return {'renders': renders,
+            'hits': stats.get('newsletter_hits', 0),
+            'average_time': render_time / 1000.0 / renders if renders else 0}
+
+def _inlined_html(request, newsletter):
+    """
+    Returns the newsletter html with the styles inlined by Premailer. The
+    result is cached so the preview and the send of an unchanged newsletter
+    render it only once.
+    """
+    key = _html_cache_key(newsletter)
+    html = cache.get(key)
+    if html is not None:
+        _incr('newsletter_hits')
+        return html
+
+    start = time.time()
     # some of these are the default parameters but we include them in case some tunning is needed later on. Premailer documentation is scarce
     pm = Premailer(_newsletter_html(request, newsletter),
                    base_url=cyc_settings.CYCLOPE_BASE_URL,
@@ -49,46 +107,46 @@ def preview(request, id):
                    exclude_pseudoclasses=False,
                    keep_style_tags=False, include_star_selectors=False,
                    external_styles=None)
-    result = pm.transform()
-    return HttpResponse(result)
+    html = pm.transform()
+    _incr('newsletter_renders')
+    _incr('newsletter_render_ms', int((time.time() - start) * 1000))
+    cache.set(key, html, cyc_settings.CYCLOPE_NEWSLETTER_CACHE_TIMEOUT)
+    return html
 
 
 @permission_required('newsletter.change_newsletter')
-def send(request, id, test=False):
+def preview(request, id):
     newsletter = Newsletter.objects.get(id=id)
-    subject = newsletter.name
-    pm = Premailer(_newsletter_html(request, newsletter),
-                   base_url=cyc_settings.CYCLOPE_BASE_URL,
-                   preserve_internal_links=True,
-                   )
-    html_message = pm.transform()
+    return HttpResponse(_inlined_html(request, newsletter))
 
-    if test:
-        recipients = map(strip, newsletter.test_recipients.split(','))
-    else:
-        recipients = map(strip, newsletter.recipients.split(','))
 
-    if newsletter.sender_name:
-        from_address = "%s <%s>" % (newsletter.sender_name, newsletter.sender)
-    else:
-        from_address = newsletter.sender
-
-    msg = EmailMessage(subject, html_message, from_address, recipients)
-    msg.content_subtype = "html"
+@permission_required('newsletter.change_newsletter')
+def send(request, id, test=False):
+    """
+    Renders the newsletter and queues its delivery, which is sent by the
+    send_newsletters command.
+    """
+    newsletter = Newsletter.objects.get(id=id)
     try:
-        msg.send()
+        html_message = _inlined_html(request, newsletter)
     except:
         logger = logging.getLogger("django.request")
         logger.exception("Newsletter send failed")
         return HttpResponseRedirect(reverse('newsletter_failed', args=[id]))
-    else:
-        return HttpResponseRedirect(reverse('newsletter_sent', args=[id]))
+    NewsletterDelivery.create(newsletter, html_message, test)
+    return HttpResponseRedirect(reverse('newsletter_sent', args=[id]))
 
 @permission_required('newsletter.change_newsletter')
 def sent(request, id, test=False):
     t = loader.get_template("newsletter/mail_sent.html")
     newsletter = Newsletter.objects.get(id=id)
-    c = RequestContext(request, {'newsletter': newsletter,})
+    try:
+        delivery = newsletter.deliveries.latest()
+    except NewsletterDelivery.DoesNotExist:
+        delivery = None
+    c = RequestContext(request, {'newsletter': newsletter,
+                                 'delivery': delivery,
+                                 'progress': delivery and delivery.progress()})
     return HttpResponse(t.render(c))
 
 @permission_required('newsletter.change_newsletter')
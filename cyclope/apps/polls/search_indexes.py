@@ -21,10 +21,11 @@
 
 from haystack.indexes import *
 from haystack import site
+from cyclope.search_indexes import QueuedSearchIndex
 import cyclope.apps.polls.models as models
 
 
-class PollIndex(RealTimeSearchIndex):
+class PollIndex(QueuedSearchIndex):
     text = CharField(document=True, use_template=True) #template: name, description
     pub_date = DateTimeField(model_attr='creation_date') #TODO: Maybe we have to add 'date'
 
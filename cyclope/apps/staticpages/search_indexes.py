@@ -21,10 +21,11 @@
 
 from haystack.indexes import *
 from haystack import site
+from cyclope.search_indexes import QueuedSearchIndex
 import cyclope.apps.staticpages.models
 
 
-class StaticPageIndex(RealTimeSearchIndex):
+class StaticPageIndex(QueuedSearchIndex):
     text = CharField(document=True, use_template=True) #template: summary, text
 
 site.register(cyclope.apps.staticpages.models.StaticPage, StaticPageIndex)
@@ -33,7 +33,8 @@ from django.template import Context
 
 import cyclope.utils
 from cyclope.frontend_views import MenuHierarchyOptions
-from cyclope.utils import NamePaginator, HyerarchyBuilderMixin
+from cyclope.utils import (NamePaginator, HyerarchyBuilderMixin,
+                           prefetch_content_objects, get_tree_children)
 from cyclope.core import frontend
 from cyclope import settings as cyc_settings
 from cyclope.core.collections.models import Collection, Category, Categorization
@@ -67,6 +68,7 @@ class CategoryRootItemsList(frontend.FrontendView):
 
     is_content_view = True
     is_region_view = True
+    region_cache_timeout = cyc_settings.CYCLOPE_REGION_CACHE_TIMEOUT
     options_form = CategoryRootListOptions
     
     def get_response(self, request, req_context, options, content_object):
@@ -161,13 +163,18 @@ def _get_paginator_page(category, options, request):
         
     paginator, page = None, None
 
-    categorizations_list = Categorization.objects.get_for_category(*search_args)
+    # anonymous users only see published contents
+    categorizations_list = Categorization.objects.get_for_category(
+        *search_args, published_only=not request.user.is_authenticated())
     if options.get("items_per_page"):
         paginator_kwargs = {"per_page": options["items_per_page"]}
         if 'ALPHABETIC' in sort_by:
-            paginator_kwargs['on'] = "content_object.name"
+            paginator_kwargs['on'] = "object_name"
         paginator = paginator_class(categorizations_list, **paginator_kwargs)
         page = cyclope.utils.get_page(paginator, request)
+        page.object_list = prefetch_content_objects(page.object_list)
+    else:
+        categorizations_list = prefetch_content_objects(categorizations_list)
     return categorizations_list, paginator, page
 
 
@@ -178,10 +185,17 @@ class CategoryTeaserList(frontend.FrontendView):
     verbose_name = _('teaser list of Category members')
     is_content_view = True
     is_region_view = True
+    region_cache_timeout = cyc_settings.CYCLOPE_REGION_CACHE_TIMEOUT
     options_form = TeaserListOptions
     inline_view_name = 'teaser'
     template = "collections/category_teaser_list.html"
 
+    def get_region_cache_timeout(self, view_options):
+        # random sorting should change on every request
+        if view_options.get("sort_by") == "RANDOM":
+            return None
+        return self.region_cache_timeout
+
     #TODO(nicoechaniz): find a more elegant way to build this view. current version is a temporary fix to a performance problem of the previous implementation when sorting big amounts of data.
     def get_response(self, request, req_context, options, content_object):
         category = content_object
@@ -299,8 +313,15 @@ class CategoryCarrousel(frontend.FrontendView):
     is_content_view = True
     is_region_view = True
     is_default = False
+    region_cache_timeout = cyc_settings.CYCLOPE_REGION_CACHE_TIMEOUT
     options_form = CarrouselOptions
 
+    def get_region_cache_timeout(self, view_options):
+        # random sorting should change on every request
+        if view_options.get("sort_by") == "RANDOM":
+            return None
+        return self.region_cache_timeout
+
     def get_response(self, request, req_context, options, content_object):
         category = content_object
         categorizations_list, _, _ = _get_paginator_page(category, options, request)
@@ -338,6 +359,7 @@ class CollectionRootCategoriesTeaserList(frontend.FrontendView):
     is_default = True
     is_content_view = True
     is_region_view = True
+    region_cache_timeout = cyc_settings.CYCLOPE_REGION_CACHE_TIMEOUT
     template = "collections/collection_root_categories_teaser_list.html"
 
     def get_response(self, request, req_context, options, content_object):
@@ -371,6 +393,7 @@ class CollectionCategoriesHierarchy(frontend.FrontendView, HyerarchyBuilderMixin
     target_view = 'default'
     is_content_view = True
     is_region_view = True
+    region_cache_timeout = cyc_settings.CYCLOPE_REGION_CACHE_TIMEOUT
     options_form = MenuHierarchyOptions
     template = "collections/collection_categories_hierarchy.html"
     if cyc_settings.CYCLOPE_THEME_TYPE == 'bootstrap':
@@ -380,10 +403,13 @@ class CollectionCategoriesHierarchy(frontend.FrontendView, HyerarchyBuilderMixin
 
     def get_response(self, request, req_context, options, content_object):
         collection = content_object
-        categories = Category.tree.filter(collection=collection, level=0)
+        # the whole collection is loaded in one query and walked in memory
+        children = get_tree_children(
+            Category.tree.filter(collection=collection).order_by('tree_id', 'lft'))
         category_list = []
-        for category in categories:
-            category_list.extend(self.make_nested_list(category, True))
+        for category in children[None]:
+            category_list.extend(
+                self.make_nested_list_from_tree(category, children, True))
         req_context.update({'categories': category_list,
                             'collection_slug': collection.slug,
                             'align': options["align"]})
@@ -477,10 +503,12 @@ class CategoryListAsForum(frontend.FrontendView):
     def get_response(self, request, req_context, options, content_object):
         category = content_object
         categorizations_list = Categorization.objects.get_for_category(
-                                  category, 'modification_date', reverse=True)
+                                  category, 'modification_date', reverse=True,
+                                  published_only=not request.user.is_authenticated())
 
         paginator = Paginator(categorizations_list, self.items_per_page)
         page = cyclope.utils.get_page(paginator, request)
+        page.object_list = prefetch_content_objects(page.object_list)
 
         for categorization in page.object_list:
             obj = categorization.content_object
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding field 'Categorization.object_name'
+        db.add_column('collections_categorization', 'object_name',
+                      self.gf('django.db.models.fields.CharField')(default='', max_length=250, blank=True),
+                      keep_default=False)
+
+        # Adding field 'Categorization.object_creation_date'
+        db.add_column('collections_categorization', 'object_creation_date',
+                      self.gf('django.db.models.fields.DateTimeField')(null=True),
+                      keep_default=False)
+
+        # Adding field 'Categorization.object_modification_date'
+        db.add_column('collections_categorization', 'object_modification_date',
+                      self.gf('django.db.models.fields.DateTimeField')(null=True),
+                      keep_default=False)
+
+        # Adding field 'Categorization.object_published'
+        db.add_column('collections_categorization', 'object_published',
+                      self.gf('django.db.models.fields.BooleanField')(default=True),
+                      keep_default=False)
+
+        # Adding indexes on 'Categorization' for the contents of a category
+        for column in ('object_name', 'object_creation_date',
+                       'object_modification_date', 'object_published'):
+            db.create_index('collections_categorization', ['category_id', column])
+
+
+    def backwards(self, orm):
+        # Removing indexes on 'Categorization'
+        for column in ('object_name', 'object_creation_date',
+                       'object_modification_date', 'object_published'):
+            db.delete_index('collections_categorization', ['category_id', column])
+
+        # Deleting field 'Categorization.object_name'
+        db.delete_column('collections_categorization', 'object_name')
+
+        # Deleting field 'Categorization.object_creation_date'
+        db.delete_column('collections_categorization', 'object_creation_date')
+
+        # Deleting field 'Categorization.object_modification_date'
+        db.delete_column('collections_categorization', 'object_modification_date')
+
+        # Deleting field 'Categorization.object_published'
+        db.delete_column('collections_categorization', 'object_published')
+
+
+    models = {
+        'collections.categorization': {
+            'Meta': {'ordering': "('order', '-id')", 'object_name': 'Categorization'},
+            'category': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'categorizations'", 'to': "orm['collections.Category']"}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'object_creation_date': ('django.db.models.fields.DateTimeField', [], {'null': 'True'}),
+            'object_id': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'}),
+            'object_modification_date': ('django.db.models.fields.DateTimeField', [], {'null': 'True'}),
+            'object_name': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '250', 'blank': 'True'}),
+            'object_published': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'order': ('django.db.models.fields.IntegerField', [], {'db_index': 'True', 'null': 'True', 'blank': 'True'})
+        },
+        'collections.category': {
+            'Meta': {'unique_together': "(('collection', 'name'),)", 'object_name': 'Category'},
+            'active': ('django.db.models.fields.BooleanField', [], {'default': 'True', 'db_index': 'True'}),
+            'collection': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'categories'", 'to': "orm['collections.Collection']"}),
+            'description': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'image': ('filebrowser.fields.FileBrowseField', [], {'max_length': '250', 'blank': 'True'}),
+            'level': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'}),
+            'lft': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'parent': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'children'", 'null': 'True', 'to': "orm['collections.Category']"}),
+            'rght': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'}),
+            'slug': ('autoslug.fields.AutoSlugField', [], {'unique': 'True', 'max_length': '50', 'populate_from': 'None', 'unique_with': '()', 'blank': 'True'}),
+            'tree_id': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'})
+        },
+        'collections.collection': {
+            'Meta': {'object_name': 'Collection'},
+            'content_types': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['contenttypes.ContentType']", 'db_index': 'True', 'symmetrical': 'False'}),
+            'default_list_view': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '255', 'blank': 'True'}),
+            'description': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'image': ('filebrowser.fields.FileBrowseField', [], {'max_length': '250', 'blank': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '100'}),
+            'navigation_root': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'slug': ('autoslug.fields.AutoSlugField', [], {'unique_with': '()', 'max_length': '50', 'populate_from': 'None', 'blank': 'True'}),
+            'view_options': ('jsonfield.fields.JSONField', [], {'default': "'{}'"}),
+            'visible': ('django.db.models.fields.BooleanField', [], {'default': 'True'})
+        },
+        'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        }
+    }
+
+    complete_apps = ['collections']
\ No newline at end of file
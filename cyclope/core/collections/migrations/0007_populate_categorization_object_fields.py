@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import DataMigration
+from django.db import models, connection
+from django.db.models.fields import FieldDoesNotExist
+
+class Migration(DataMigration):
+
+    def forwards(self, orm):
+        # Copies the name, dates and published state of the categorized
+        # contents, with one UPDATE per content type. Contents whose tables
+        # lack a column keep the default, update_categorizations fills them
+        # once every app is migrated.
+        qn = connection.ops.quote_name
+        cursor = connection.cursor()
+        tables = connection.introspection.table_names()
+        Categorization = orm['collections.Categorization']
+        ct_ids = Categorization.objects.order_by().values_list('content_type', flat=True).distinct()
+        for ctype in orm['contenttypes.ContentType'].objects.filter(pk__in=list(ct_ids)):
+            model = models.get_model(ctype.app_label, ctype.model)
+            if model is None:
+                continue
+            assignments = []
+            for field_name in ('name', 'creation_date', 'modification_date', 'published'):
+                try:
+                    field = model._meta.get_field(field_name)
+                except FieldDoesNotExist:
+                    continue
+                # the field may live in the table of a concrete parent model
+                opts = field.model._meta
+                if opts.db_table not in tables:
+                    continue
+                columns = [c[0] for c in connection.introspection.get_table_description(
+                                                                    cursor, opts.db_table)]
+                if field.column not in columns:
+                    continue
+                # orphan categorizations keep their values
+                column = qn('object_' + field_name)
+                assignments.append("%s = COALESCE((SELECT %s FROM %s WHERE %s = %s.%s), %s)" % (
+                    column, qn(field.column), qn(opts.db_table), qn(opts.pk.column),
+                    qn('collections_categorization'), qn('object_id'), column))
+            if assignments:
+                db.execute("UPDATE %s SET %s WHERE %s = %%s" % (
+                    qn('collections_categorization'), ", ".join(assignments),
+                    qn('content_type_id')), [ctype.pk])
+
+    def backwards(self, orm):
+        # the columns are dropped by the previous migration
+        pass
+
+    models = {
+        'collections.categorization': {
+            'Meta': {'ordering': "('order', '-id')", 'object_name': 'Categorization'},
+            'category': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'categorizations'", 'to': "orm['collections.Category']"}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'object_creation_date': ('django.db.models.fields.DateTimeField', [], {'null': 'True'}),
+            'object_id': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'}),
+            'object_modification_date': ('django.db.models.fields.DateTimeField', [], {'null': 'True'}),
+            'object_name': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '250', 'blank': 'True'}),
+            'object_published': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'order': ('django.db.models.fields.IntegerField', [], {'db_index': 'True', 'null': 'True', 'blank': 'True'})
+        },
+        'collections.category': {
+            'Meta': {'unique_together': "(('collection', 'name'),)", 'object_name': 'Category'},
+            'active': ('django.db.models.fields.BooleanField', [], {'default': 'True', 'db_index': 'True'}),
+            'collection': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'categories'", 'to': "orm['collections.Collection']"}),
+            'description': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'image': ('filebrowser.fields.FileBrowseField', [], {'max_length': '250', 'blank': 'True'}),
+            'level': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'}),
+            'lft': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'parent': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'children'", 'null': 'True', 'to': "orm['collections.Category']"}),
+            'rght': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'}),
+            'slug': ('autoslug.fields.AutoSlugField', [], {'unique': 'True', 'max_length': '50', 'populate_from': 'None', 'unique_with': '()', 'blank': 'True'}),
+            'tree_id': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'})
+        },
+        'collections.collection': {
+            'Meta': {'object_name': 'Collection'},
+            'content_types': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['contenttypes.ContentType']", 'db_index': 'True', 'symmetrical': 'False'}),
+            'default_list_view': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '255', 'blank': 'True'}),
+            'description': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'image': ('filebrowser.fields.FileBrowseField', [], {'max_length': '250', 'blank': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '100'}),
+            'navigation_root': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'slug': ('autoslug.fields.AutoSlugField', [], {'unique_with': '()', 'max_length': '50', 'populate_from': 'None', 'blank': 'True'}),
+            'view_options': ('jsonfield.fields.JSONField', [], {'default': "'{}'"}),
+            'visible': ('django.db.models.fields.BooleanField', [], {'default': 'True'})
+        },
+        'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        }
+    }
+
+    complete_apps = ['collections']
+    symmetrical = True
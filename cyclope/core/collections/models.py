@@ -24,15 +24,13 @@ core.collections.models
 -----------------------
 Django models for generic categorization of content objects
 """
-import random
-from operator import attrgetter
-from collections import defaultdict
-
-from django.db import models
+from django.db import models, connection, transaction
+from django.db.models import Count, Max
+from django.db.models.fields import FieldDoesNotExist
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
-from django.db.models.signals import m2m_changed
+from django.db.models.signals import m2m_changed, post_save
 
 import mptt
 from jsonfield import JSONField
@@ -141,44 +139,106 @@ class Category(models.Model, ThumbnailMixin):
 mptt.register(Category)
 
 
-def dictfetchall(cursor): 
-    "Returns all rows from a cursor as a dict" 
-    desc = cursor.description 
-    return [
-        dict(zip([col[0] for col in desc], row)) 
-        for row in cursor.fetchall() 
-    ]
+# fields of the content objects copied to their Categorizations as object_<name>
+DENORMALIZED_FIELDS = ('name', 'creation_date', 'modification_date', 'published')
+
+def object_fields_for(obj):
+    """Returns the values of the denormalized fields of a content object."""
+    return dict(('object_' + name, getattr(obj, name, None))
+                for name in DENORMALIZED_FIELDS if hasattr(obj, name))
 
 class CategorizationManager(models.Manager):
 
-    def _content_in_categories(self, q):
-        from django.db import connection
-        cursor = connection.cursor()
-        cursor.execute( q )
-        result_list = []
-        for row in dictfetchall(cursor):
-            num_cat = row.pop("num_cat", None)
-            cat = self.model(**row)
-            if num_cat: cat.num_cat = num_cat
-            result_list.append(cat)
-        return result_list
-
-# These queries are not ANSI SQL standard, backticks are MySQL specific although Sqlite accepts them.
-# Might be better to change backticks for double quotes. MySQL should then be set to use ANSI:
-# SET GLOBAL SQL_MODE=ANSI_QUOTES; for the queries to work properly
+    def _content_in_categories(self, categories, intersection=False):
+        """
+        Returns the Categorizations of the given categories, one for each
+        content object. If intersection is True only the objects that are
+        in all the categories are returned.
+        """
+        cats = self.filter(category__in=categories)
+        if len(categories) > 1 or intersection:
+            # a content object may be in several of the categories
+            grouped = cats.values('content_type', 'object_id').annotate(
+                num_cat=Count('category', distinct=True), last_id=Max('id'))
+            if intersection:
+                grouped = grouped.filter(num_cat=len(categories))
+            cats = self.filter(pk__in=grouped.values('last_id'))
+        return cats
+
     def content_object_in_all(self, categories):
-        category_ids = ",".join([ str(category.id) for category in categories ])
-        q = """
-        SELECT *, COUNT(collections_categorization.category_id) AS num_cat FROM collections_categorization WHERE (collections_categorization.category_id IN (%s)) GROUP BY collections_categorization.content_type_id, collections_categorization.object_id HAVING COUNT(collections_categorization.category_id) = %s  ORDER BY `collections_categorization`.`order` ASC, `collections_categorization`.`id` DESC
-        """ % (category_ids, len(categories))
-        return self._content_in_categories(q)
+        return self._content_in_categories(categories, intersection=True)
 
     def content_object_in_any(self, categories):
-        category_ids = ",".join([ str(category.id) for category in categories ])
-        q = """
-        SELECT * FROM collections_categorization WHERE (collections_categorization.category_id IN (%s)) GROUP BY collections_categorization.content_type_id, collections_categorization.object_id ORDER BY `collections_categorization`.`order` ASC, `collections_categorization`.`id` DESC
-        """ % category_ids
-        return self._content_in_categories(q)
+        return self._content_in_categories(categories)
+
+    def _content_field_subquery(self, content_type_id, field_name):
+        """
+        Returns an SQL subquery selecting field_name from the content object
+        of a Categorization of the given content type, or None if the model
+        lacks that field.
+        """
+        qn = connection.ops.quote_name
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is None:
+            return None
+        try:
+            field = model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            return None
+        # the field may live in the table of a concrete parent model
+        opts = field.model._meta
+        return "(SELECT %s FROM %s WHERE %s = %s.%s)" % (
+            qn(field.column), qn(opts.db_table), qn(opts.pk.column),
+            qn(self.model._meta.db_table), qn('object_id'))
+
+    def _content_field_sql(self, content_type_ids, field_name):
+        """
+        Returns an SQL expression with the value of field_name of the content
+        object of each Categorization, or NULL for content types lacking it.
+        """
+        qn = connection.ops.quote_name
+        cases = []
+        for ct_id in content_type_ids:
+            subquery = self._content_field_subquery(ct_id, field_name)
+            if subquery is not None:
+                cases.append("WHEN %d THEN %s" % (ct_id, subquery))
+        if not cases:
+            return "NULL"
+        return "CASE %s.%s %s END" % (qn(self.model._meta.db_table),
+                                      qn('content_type_id'), " ".join(cases))
+
+    def update_object_fields(self, obj):
+        """Copies the denormalized fields of obj to its Categorizations."""
+        return self.get_for_object(obj).update(**object_fields_for(obj))
+
+    def update_all_object_fields(self):
+        """
+        Copies the denormalized fields from the content objects of all the
+        Categorizations, with one UPDATE per content type.
+
+        Returns the number of updated Categorizations.
+        """
+        qn = connection.ops.quote_name
+        table = self.model._meta.db_table
+        ct_ids = self.order_by().values_list('content_type', flat=True).distinct()
+        cursor = connection.cursor()
+        updated = 0
+        for ct_id in list(ct_ids):
+            assignments = []
+            for field_name in DENORMALIZED_FIELDS:
+                subquery = self._content_field_subquery(ct_id, field_name)
+                if subquery is not None:
+                    # orphan categorizations keep their values
+                    column = qn('object_' + field_name)
+                    assignments.append("%s = COALESCE(%s, %s)" % (column, subquery,
+                                                                  column))
+            if assignments:
+                cursor.execute("UPDATE %s SET %s WHERE %s = %%s" % (
+                    qn(table), ", ".join(assignments), qn('content_type_id')),
+                    [ct_id])
+                updated += cursor.rowcount
+        transaction.commit_unless_managed()
+        return updated
 
     def get_for_object(self, obj):
         """Get all Categorizations for an instance of a content object.
@@ -199,10 +259,24 @@ class CategorizationManager(models.Manager):
         return self.filter(content_type__pk=ctype.pk)
 
     def get_for_category(self, category, sort_property="name", limit=None,
-                         traverse_children=False, reverse=False, intersection=False):
+                         traverse_children=False, reverse=False, intersection=False,
+                         published_only=False):
+        """Get the Categorizations of the content objects in a category.
+
+        Filtering, sorting and limiting are done by the database and a lazy
+        QuerySet is returned, so slicing it only fetches the requested rows.
+
+        Args:
+          category: a Category or an iterable of categories
+          sort_property: "creation_date" for the categorizations order, "random"
+            or the name of a field of the content objects, like "name"
+          limit: max number of categorizations
+          intersection: only contents in all the categories
+          published_only: exclude unpublished contents
+        """
         try:
             categories = list(category)
-        except:
+        except TypeError:
             categories = [category]
 
         if traverse_children:
@@ -210,45 +284,39 @@ class CategorizationManager(models.Manager):
             # then enable traverse_children option in CategoryFilteredList view
             # and remove intersection = False here
             intersection = False
-            for cat in categories:
+            for cat in list(categories):
                 categories += list(cat.get_descendants())
 
-        if intersection:
-            cats = Categorization.objects.content_object_in_all(categories)
-        else:
-            cats = Categorization.objects.content_object_in_any(categories)
+        if not categories:
+            return self.none()
+
+        cats = self._content_in_categories(categories, intersection)
+
+        if published_only:
+            cats = cats.filter(object_published=True)
 
         if sort_property == "random":
-            cats = list(cats)
-            random.shuffle(cats)
+            cats = cats.order_by('?')
         elif sort_property == "creation_date":
-            # the default ordering is reversed
+            # the default ordering (set by editors) goes from newest to oldest
             if not reverse:
-                cats.reverse()
-        else: # sort by name
-            ct_vals = defaultdict(list)
-            for cat in cats:
-                ct_vals[cat.content_type_id].append(cat.object_id)
-            # Iterate over content_types fetching the sort_key of the content_object and saving in sort_attrs dict
-            sort_attrs = {}
-            def chunks(l, n):
-                """ Yield successive n-sized chunks from l.
-                """
-                for i in xrange(0, len(l), n):
-                    yield l[i:i+n]
-            for ct_id, object_ids in ct_vals.iteritems():
-                ct = ContentType.objects.get_for_id(ct_id)
-                for object_ids in chunks(object_ids, 450):
-                    for obj_id, val in ct.get_all_objects_for_this_type(pk__in=object_ids).values_list("pk", sort_property):
-                        sort_attrs[(ct_id, obj_id)] = val
-            
-            cats = sorted(cats, key=lambda c: sort_attrs[(c.content_type_id, c.object_id)],
-                          reverse=reverse)
-
-        if cats:
-            return cats[slice(limit)]
+                cats = cats.reverse()
+        elif sort_property in DENORMALIZED_FIELDS:
+            field_name = 'object_' + sort_property
+            if reverse:
+                cats = cats.order_by('-' + field_name, 'id')
+            else:
+                cats = cats.order_by(field_name, '-id')
         else:
-            return Categorization.objects.none()
+            ct_ids = cats.order_by().values_list('content_type', flat=True).distinct()
+            cats = cats.extra(
+                select={'sort_key': self._content_field_sql(list(ct_ids), sort_property)})
+            if reverse:
+                cats = cats.extra(order_by=['-sort_key', 'id'])
+            else:
+                cats = cats.extra(order_by=['sort_key', '-id'])
+
+        return cats[:limit]
 
 
 class Categorization(models.Model):
@@ -262,16 +330,25 @@ class Categorization(models.Model):
     content_object = generic.GenericForeignKey('content_type', 'object_id')
     order = models.IntegerField(blank=True, null=True, db_index=True,
                                 verbose_name=_('order'))
+    # copied from the content object to sort and filter in the database.
+    # the migration adds indexes on (category, object_*) for each of them.
+    object_name = models.CharField(_('name'), max_length=250, blank=True,
+                                   default='', editable=False)
+    object_creation_date = models.DateTimeField(_('creation date'), null=True,
+                                                editable=False)
+    object_modification_date = models.DateTimeField(_('modification date'),
+                                                    null=True, editable=False)
+    object_published = models.BooleanField(_('published'), default=True,
+                                           editable=False)
 
     objects = CategorizationManager()
 
-    @property
-    def object_modification_date(self):
-        return self.content_object.modification_date
-
-    @property
-    def object_creation_date(self):
-        return self.content_object.creation_date
+    def save(self, *args, **kwargs):
+        content_object = self.content_object
+        if content_object is not None:
+            for name, value in object_fields_for(content_object).iteritems():
+                setattr(self, name, value)
+        super(Categorization, self).save(*args, **kwargs)
 
     def __repr__(self):
         return '<%s@%s>' % (repr(self.content_object), repr(self.category))
@@ -298,3 +375,11 @@ class Collectible(models.Model):
 
     class Meta:
         abstract = True
+
+
+def _update_categorizations(sender, instance, **kwargs):
+    if isinstance(instance, Collectible) and not kwargs.get('raw', False):
+        Categorization.objects.update_object_fields(instance)
+
+post_save.connect(_update_categorizations,
+                  dispatch_uid="cyclope.collections.update_categorizations")
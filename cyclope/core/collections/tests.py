@@ -26,6 +26,7 @@ from django.contrib.auth.models import User
 
 from cyclope.tests import ViewableTestCase
 from models import Collection, Category, Categorization
+from cyclope.utils import prefetch_content_objects
 from cyclope.apps.articles.models import Article
 from cyclope.apps.staticpages.models import StaticPage
 
@@ -48,6 +49,23 @@ class CategoryTestCase(ViewableTestCase):
         request.user, created = User.objects.get_or_create(username='johny')
         return request
 
+    def test_unpublished_hidden_from_anonymous(self):
+        from django.contrib.auth.models import AnonymousUser
+        from frontend_views import _get_paginator_page
+        for n in range(3):
+            article = Article.objects.create(name="Draft %d" % n, published=False)
+            Categorization.objects.create(category=self.test_object, content_object=article)
+        options = {'sort_by': 'DATE-', 'limit_to_n_items': 0, 'items_per_page': 2}
+        request = self.get_request()
+        _, paginator, page = _get_paginator_page(self.test_object, options, request)
+        self.assertEqual(paginator.count, 4)
+        request.user = AnonymousUser()
+        _, paginator, page = _get_paginator_page(self.test_object, options, request)
+        # filtered by the database, so the count and the pages are right
+        self.assertEqual(paginator.count, 1)
+        self.assertEqual([c.content_object.name for c in page.object_list],
+                         ["Test article"])
+
 class CategorizationOrderTestCase(TestCase):
 
     def setUp(self):
@@ -207,10 +225,89 @@ class CategorizationManagerTests(TestCase):
             article = Article.objects.create(name="Test article %d" % n, text="prueba"*100)
             article.categories.create(category=category)
 
-        self.assertNumQueries(3, Categorization.objects.get_for_category, category)
+        self.assertNumQueries(1, lambda: list(Categorization.objects.get_for_category(category)))
+        cats = Categorization.objects.get_for_category(category)
+        self.assertEqual([c.content_object.name for c in cats[:3]],
+                         ["Test article 0", "Test article 1", "Test article 2"])
+        self.assertEqual(len(Categorization.objects.get_for_category(category, limit=5)), 5)
 
         cats = Categorization.objects.get_for_category(category, sort_property="creation_date", reverse=True)
         self.assertEqual(cats[0].content_object, Article.objects.latest("creation_date"))
 
         cats_random = Categorization.objects.get_for_category(category, sort_property="random")
         self.assertEqual(len(cats), len(cats_random))
+
+    def test_get_for_categories(self):
+        col = Collection.objects.create(name='tema')
+        cat_a = Category.objects.create(name='A', collection=col)
+        cat_b = Category.objects.create(name='B', collection=col)
+        both = Article.objects.create(name="In both")
+        both.categories.create(category=cat_a)
+        both.categories.create(category=cat_b)
+        only_a = Article.objects.create(name="Only in A", published=False)
+        only_a.categories.create(category=cat_a)
+
+        get_for_category = Categorization.objects.get_for_category
+        self.assertEqual([c.content_object for c in get_for_category([cat_a, cat_b])],
+                         [both, only_a])
+        self.assertEqual([c.content_object for c in get_for_category(
+                            [cat_a, cat_b], intersection=True)], [both])
+        self.assertEqual([c.content_object for c in get_for_category(
+                            cat_a, reverse=True, published_only=True)], [both])
+
+    def test_prefetch_content_objects(self):
+        col = Collection.objects.create(name='tema')
+        category = Category.objects.create(name='Category', collection=col)
+        for n in range(5):
+            StaticPage.objects.create(name="static %d" % n).categories.create(category=category)
+            Article.objects.create(name="article %d" % n).categories.create(category=category)
+        cats = list(Categorization.objects.get_for_category(category))
+        # the content types come from the cache
+        from cyclope.apps.medialibrary.models import Picture
+        for model in (StaticPage, Article, Picture):
+            ContentType.objects.get_for_model(model)
+        # one query for each content type and one for the related pictures
+        self.assertNumQueries(3, prefetch_content_objects, cats)
+        self.assertNumQueries(0, lambda: [c.content_object.name for c in cats])
+        static_pages = [c.content_object for c in cats
+                        if isinstance(c.content_object, StaticPage)]
+        self.assertNumQueries(0, lambda: [p.pictures() for p in static_pages])
+        self.assertEqual(cats[0].content_object, Article.objects.get(name="article 0"))
+
+    def test_object_fields(self):
+        col = Collection.objects.create(name='tema')
+        category = Category.objects.create(name='Category', collection=col)
+        article = Article.objects.create(name="An article")
+        cat = article.categories.create(category=category)
+        self.assertEqual(cat.object_name, "An article")
+        self.assertEqual(cat.object_creation_date, article.creation_date)
+
+        article.name = "Renamed"
+        article.published = False
+        article.save()
+        cat = Categorization.objects.get(pk=cat.pk)
+        self.assertEqual(cat.object_name, "Renamed")
+        self.assertFalse(cat.object_published)
+
+        Categorization.objects.update(object_name='', object_published=True)
+        self.assertEqual(Categorization.objects.update_all_object_fields(), 1)
+        cat = Categorization.objects.get(pk=cat.pk)
+        self.assertEqual(cat.object_name, "Renamed")
+        self.assertFalse(cat.object_published)
+
+        # a categorization of a deleted content keeps its values
+        Categorization.objects.filter(pk=cat.pk).update(object_id=article.pk + 1)
+        Categorization.objects.update_all_object_fields()
+        self.assertEqual(Categorization.objects.get(pk=cat.pk).object_name, "Renamed")
+
+    def test_name_paginator_empty_names(self):
+        from cyclope.utils import NamePaginator
+        col = Collection.objects.create(name='tema')
+        category = Category.objects.create(name='Category', collection=col)
+        article = Article.objects.create(name="An article")
+        article.categories.create(category=category)
+        Categorization.objects.create(category=category, object_id=article.pk,
+                                      content_type=ContentType.objects.get_for_model(Article))
+        Categorization.objects.update(object_name='')
+        paginator = NamePaginator(Categorization.objects.all(), on="object_name")
+        self.assertEqual(paginator.count, 2)
@@ -32,6 +32,15 @@ def site_settings(request):
     return settings_dict
 
 
+def layout(request):
+    """Exposes the template of the layout of the request as layout_template,
+    for the templates of external apps to extend from.
+    """
+    from cyclope.utils import get_page_context
+    # a callable, so the layout is only resolved by templates that use it
+    return {'layout_template': lambda: get_page_context(request).template}
+
+
 def compressor(request):
     """Exposes COMPRESS_ENABLED setting.
     """
@@ -25,14 +25,43 @@ core.frontend
 """
 
 
+import hashlib
+from datetime import datetime
+
 from django.http import HttpResponse
+from django.core.cache import cache
 from django.utils.translation import ugettext_lazy as _
 from django.template import RequestContext
 from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
+from django.utils.cache import patch_cache_control, patch_vary_headers
 
 from sites import site
 
-from cyclope.utils import template_for_request
+from cyclope.utils import (template_for_request, layout_for_request,
+                           get_cache_version, CACHE_VERSION_TIMEOUT)
+from cyclope.page_cache import add_page_tags, object_tag, model_tag
+
+
+def _etag_date(etag):
+    # the Last-Modified of a page is the first time its ETag was seen
+    key = 'cyclope_etag_%s' % etag
+    cache.add(key, datetime.now(), CACHE_VERSION_TIMEOUT)
+    return cache.get(key) or datetime.now()
+
+def _is_authenticated(request):
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_authenticated()
+
+def _renders_comment_form(content_object):
+    # the captcha of the comment form can be answered only once, so pages
+    # showing it can't be served again from the browser cache
+    allow_comments = getattr(content_object, 'allow_comments', 'NO')
+    if allow_comments == 'SITE':
+        from cyclope.models import SiteSettings
+        from cyclope.utils import get_singleton
+        allow_comments = get_singleton(SiteSettings).allow_comments
+    return allow_comments == 'YES'
 
 
 class FrontendView(object):
@@ -55,6 +84,13 @@ class FrontendView(object):
         is_content_view(boolean): sets whether the view can be used for main page content
 
         is_region_view(boolean): sets whether the view can be included in layout regions
+
+        region_cache_timeout(int): seconds the output of the view is cached when
+            rendered in a region for anonymous users. None disables the cache.
+
+        conditional_get(boolean): whether instance views answer conditional
+            requests with 304 Not Modified when the page didn't change. Pages
+            with the comment form are always rendered.
     """
 
     name = ''
@@ -64,6 +100,8 @@ class FrontendView(object):
     is_instance_view = True
     is_content_view = False
     is_region_view = False
+    region_cache_timeout = None
+    conditional_get = True
     extra_context = {}
     params = {}
     options_form = None
@@ -95,6 +133,7 @@ class FrontendView(object):
                 content_object = get_object_or_404(self.model, slug=slug)
 
             req_context["current_object"] = content_object
+            add_page_tags(request, object_tag(content_object))
             if self.is_content_view and not region_name:
                 if hasattr(content_object, "name"):
                     title = _(content_object.name)
@@ -102,8 +141,31 @@ class FrontendView(object):
                     title = unicode(content_object)
                 req_context["title"] = title.capitalize()
 
-            response = self.get_response(request, req_context, options, content_object)
+            etag = None
+            if not region_name and self.conditional_get:
+                etag = self.get_etag(request, content_object)
+            if etag is not None:
+                def render(request):
+                    response = self.get_response(request, req_context, options,
+                                                 content_object)
+                    if not isinstance(response, HttpResponse):
+                        response = HttpResponse(response)
+                    return response
+                response = condition(lambda request: etag,
+                                     lambda request: _etag_date(etag))(render)(request)
+                # pages of authenticated users can't be kept by shared caches,
+                # anonymous ones can and are revalidated with the ETag
+                if _is_authenticated(request):
+                    patch_cache_control(response, private=True, max_age=0,
+                                        must_revalidate=True)
+                else:
+                    patch_cache_control(response, public=True, max_age=0,
+                                        must_revalidate=True)
+                    patch_vary_headers(response, ('Cookie',))
+            else:
+                response = self.get_response(request, req_context, options, content_object)
         else:
+            add_page_tags(request, model_tag(self.model))
             response = self.get_response(request, req_context, options)
 
         # region_name will hold a value if the view was called from a region templatetag
@@ -118,6 +180,32 @@ class FrontendView(object):
         """
         raise NotImplementedError()
 
+    def get_etag(self, request, content_object):
+        """Returns the ETag of the page of content_object, None if it can't
+        be validated. It changes when the object, the layout, the site
+        settings, any region content or the comments change.
+        """
+        from cyclope.models import REGION_CACHE, COMMENTS_CACHE
+        modification_date = getattr(content_object, 'modification_date', None)
+        if modification_date is None or request.method not in ('GET', 'HEAD') \
+               or _renders_comment_form(content_object):
+            return None
+        layout = layout_for_request(request)
+        # anonymous users share the ETag
+        user_id = _is_authenticated(request) and request.user.id or None
+        parts = (self.name, content_object._meta.app_label,
+                 content_object._meta.module_name, content_object.pk,
+                 modification_date, request.get_full_path(),
+                 user_id, layout and layout.pk,
+                 get_cache_version(REGION_CACHE), get_cache_version(COMMENTS_CACHE))
+        return hashlib.md5(repr(parts)).hexdigest()
+
+    def get_region_cache_timeout(self, view_options):
+        """Returns the seconds the output of the view with the given options
+        may be cached when rendered in a region, None to disable the cache.
+        """
+        return self.region_cache_timeout
+
     def get_default_options(self):
         options = {}
         if self.options_form:
@@ -25,20 +25,138 @@ core.frontend.sites
 Frontend views' URL handling.
 """
 
-from django.http import HttpResponse, HttpResponseForbidden
+from collections import defaultdict
+
+from django.http import HttpResponse, HttpResponseForbidden, Http404
 from django.template import RequestContext, loader
 from django.conf.urls import patterns, url
+from django.core.urlresolvers import RegexURLPattern, ResolverMatch
 from django.utils.translation import ugettext_lazy as _, ugettext
 from django.core.exceptions import ObjectDoesNotExist, ImproperlyConfigured
 from django.contrib.contenttypes.models import ContentType
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.utils import simplejson
 from django.db.models import get_model
 from django.contrib.admin.views.decorators import staff_member_required
-from cyclope.models import MenuItem, SiteSettings, BaseContent
+from cyclope.models import MenuItem, BaseContent
 import cyclope
-from cyclope.utils import layout_for_request, LazyJSONEncoder, get_object_name
-from cyclope.themes import get_theme
+from cyclope.utils import (layout_for_request, LazyJSONEncoder, get_object_name,
+                           get_cache_version, bump_cache_version, get_page_context)
+
+# name of the cache version of the menu item routes
+MENU_URLS_CACHE = 'menu_urls'
+
+
+class MenuItemRouter(object):
+    """Maps the URL of every active MenuItem to the view that serves it.
+
+    Routes are kept in memory and updated from MenuItem signals. A version
+    stamp in the shared cache lets every other process notice the change and
+    rebuild its routes on the next request.
+    """
+    def __init__(self, site):
+        self.site = site
+        self._routes = None
+        self._urls = {}
+        self._version = None
+
+    def __call__(self, request, url):
+        route = self.resolve(url)
+        if route is None:
+            raise Http404
+        view, kwargs = route
+        return view(request, **kwargs)
+
+    def resolve(self, url):
+        """Returns a (view, kwargs) tuple for the MenuItem url or None."""
+        return self.get_routes().get(url)
+
+    def get_routes(self):
+        version = get_cache_version(MENU_URLS_CACHE)
+        if self._routes is None or version != self._version:
+            self._load(version)
+        return self._routes
+
+    def _load(self, version):
+        routes, urls = {}, {}
+        items = list(MenuItem.objects.filter(active=True, custom_url=''))
+        slugs = self._get_slugs(items)
+        for item in items:
+            route = self.get_route(item, slugs)
+            if route is not None:
+                routes[item.url] = route
+                urls[item.pk] = item.url
+        self._routes, self._urls, self._version = routes, urls, version
+
+    def _get_slugs(self, items):
+        """Fetches the slugs of the items' content objects with one query
+        per content type."""
+        ids_by_ctype = defaultdict(list)
+        for item in items:
+            if item.content_type_id and item.object_id:
+                ids_by_ctype[item.content_type_id].append(item.object_id)
+        slugs = {}
+        for ctype_id, ids in ids_by_ctype.iteritems():
+            model = ContentType.objects.get_for_id(ctype_id).model_class()
+            if model is None:
+                continue
+            for pk, slug in model._default_manager.filter(pk__in=ids).values_list('pk', 'slug'):
+                slugs[(ctype_id, pk)] = slug
+        return slugs
+
+    def get_route(self, item, slugs=None):
+        # custom urls are not supposed to be handled by Cyclope
+        if item.custom_url:
+            return None
+        if item.content_type_id is not None:
+            model = ContentType.objects.get_for_id(item.content_type_id).model_class()
+            if model is None:
+                return None
+            view = self.site.get_view(model, item.content_view)
+            if slugs is None:
+                slugs = self._get_slugs([item])
+            slug = slugs.get((item.content_type_id, item.object_id))
+            if slug is not None:
+                return view, {'slug': slug, 'view_options': item.view_options}
+            else:
+                return view, {'view_options': item.view_options}
+        # this menu item has no content so we will only display the layout
+        else:
+            return self.site.no_content_layout_view, {}
+
+    def item_changed(self, item, deleted=False, raw=False):
+        """Updates the route of a saved or deleted MenuItem."""
+        up_to_date = (self._routes is not None and not raw and
+                      self._version == get_cache_version(MENU_URLS_CACHE))
+        bump_cache_version(MENU_URLS_CACHE)
+        if not up_to_date:
+            self._routes = None
+            return
+        old_url = self._urls.pop(item.pk, None)
+        if old_url is not None:
+            self._routes.pop(old_url, None)
+        if not deleted and item.active:
+            route = self.get_route(item)
+            if route is not None:
+                self._routes[item.url] = route
+                self._urls[item.pk] = item.url
+        self._version = get_cache_version(MENU_URLS_CACHE)
+
+
+class MenuItemURLPattern(RegexURLPattern):
+    """An URL pattern that matches the URLs of active MenuItems using
+    a MenuItemRouter instead of a regular expression."""
+
+    def __init__(self, router):
+        super(MenuItemURLPattern, self).__init__(r'^(?P<url>.+)$', router)
+        self.router = router
+
+    def resolve(self, path):
+        route = self.router.resolve(path)
+        if route is not None:
+            view, kwargs = route
+            return ResolverMatch(view, (), kwargs)
+
 
 class CyclopeSite(object):
     """Handles frontend display of models.
@@ -50,6 +168,7 @@ class CyclopeSite(object):
         self._registry_ctype_choices = [('', '------')]
         self._menuitem_ctype_choices = [('', '------')]
         self._regionview_ctype_choices = [('', '------')]
+        self.menu_item_router = MenuItemRouter(self)
 
     def register_view(self, model, view_class):
         """Register a view for a model.
@@ -134,7 +253,7 @@ class CyclopeSite(object):
                     urlpatterns += patterns('', url(url_pattern, view, name=model_name))
 
         # url patterns for menu items
-        urlpatterns.extend(self.get_menuitem_urls())
+        urlpatterns.append(MenuItemURLPattern(self.menu_item_router))
         return urlpatterns
 
     def get_url_pattern_for_view(self, view, model_name):
@@ -152,32 +271,6 @@ class CyclopeSite(object):
     def get_url_name_for_view(self, view, model_name):
         return "%s-%s" % (model_name, view.name)
 
-    def get_menuitem_urls(self):
-        urlpatterns = []
-        for item in MenuItem.tree.filter(active=True):
-            # custom urls are not supposed to be handled by Cyclope
-            if item.custom_url:
-                continue
-            if item.content_object is not None: # if True: content_type should not be None
-                obj = item.content_object
-                view = self.get_view(obj, item.content_view)
-                view_options = item.view_options
-                urlpatterns += patterns('', url('^%s$' % item.url, view,
-                                                   {'slug': obj.slug,
-                                                    'view_options':view_options}))
-            elif item.content_type is not None:
-                mdl = item.content_type.model_class()
-                view = self.get_view(mdl, item.content_view)
-                view_options = item.view_options
-                urlpatterns += patterns('', url('^%s$' % item.url, view,
-                                        {'view_options':view_options}))
-
-            # this menu item has no content so we will only display the layout
-            else:
-                urlpatterns += patterns('', url(r'^%s$' % item.url,
-                                                   self.no_content_layout_view))
-        return urlpatterns
-
     def get_default_view_name(self, model):
         """Returns the view name for the default view of the given model
         """
@@ -259,29 +352,24 @@ class CyclopeSite(object):
         """Returns the categories that belong to the sellected collection."""
         Collection = get_model('collections','collection')
         Category = get_model('collections','category')
-        CategoryPermission = get_model('perms','CategoryPermission')
-        CollectionPermission = get_model('perms','CollectionPermission')
+        from cyclope.core.perms.backends import has_global_perms, get_permission_matrix
         try:
             pk = int(request.GET['q'])
             collection = Collection.objects.get(pk=pk)
             u = request.user
             col_categories = Category.tree.filter(collection=collection)
             # if the user can modify any category, we infer he can categorize any content also
-            if u.is_authenticated() and (u.is_superuser or
-               u.is_staff and u.has_perm('collections.change_category')):
+            if has_global_perms(u):
                 allowed_categories = col_categories
-            elif u.is_anonymous():
-                allowed_categories = Category.tree.none()
             else:
-                has_col_perm = CollectionPermission.objects.filter(collection=collection, user=u,
-                                                                   can_add_content=True)
+                matrix = get_permission_matrix(u)
                 # user can add content in any category for this collection
-                if has_col_perm:
+                if collection.pk in matrix.collections['add_content']:
                     allowed_categories = col_categories
                 # only return categories where the user is allowed to add content
                 else:
-                    allowed_cat_ids = CategoryPermission.objects.values_list("category").filter(category__in=col_categories, user=u, can_add_content=True)
-                    allowed_categories = col_categories.filter(id__in=allowed_cat_ids)
+                    allowed_categories = col_categories.filter(
+                        id__in=matrix.categories['add_content'])
 
             categories = [{'category_id': '', 'category_name': '------'}]
             categories.extend([
@@ -297,8 +385,7 @@ class CyclopeSite(object):
     def layout_regions_json(self, request):
         """View to dynamically update template regions select in the admin."""
         template_filename = request.GET['q']
-        theme_name = SiteSettings.objects.get().theme
-        theme_settings = get_theme(theme_name)
+        theme_settings = get_page_context(request).theme
 
         regions = theme_settings.layout_templates[template_filename]['regions']
         regions_data = [{'region_name': '', 'verbose_name': '------'}]
@@ -428,13 +515,15 @@ class CyclopeSite(object):
 
 site = CyclopeSite()
 
-def _refresh_site_urls(sender, instance, created, **kwargs):
-    "Callback to refresh site url patterns when a MenuItem is modified"
-    from django.conf import settings
-    import sys
-    try:
-        return reload(sys.modules[settings.ROOT_URLCONF])
-    except KeyError:
-        # fails when testing...
-        pass
-post_save.connect(_refresh_site_urls, sender=MenuItem, dispatch_uid="cyclope.core.frontend.sites")
+def _update_menu_item_route(sender, instance, **kwargs):
+    "Callback to update the menu item routes when a MenuItem is modified"
+    site.menu_item_router.item_changed(instance, raw=kwargs.get('raw', False))
+
+def _delete_menu_item_route(sender, instance, **kwargs):
+    "Callback to remove the route of a deleted MenuItem"
+    site.menu_item_router.item_changed(instance, deleted=True)
+
+post_save.connect(_update_menu_item_route, sender=MenuItem,
+                  dispatch_uid="cyclope.core.frontend.sites")
+post_delete.connect(_delete_menu_item_route, sender=MenuItem,
+                    dispatch_uid="cyclope.core.frontend.sites")
@@ -28,9 +28,103 @@ Authorizacion backends.
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth.models import User
+from django.db.models import Q
 
+import cyclope.settings as cyc_settings
+from cyclope.utils import get_or_set_cache, get_cache_version, make_cache_key
 from cyclope.core.collections.models import Categorization, Collectible, Category
-from models import CategoryPermission, CollectionPermission
+from models import CategoryPermission, CollectionPermission, PERMS_CACHE
+
+PERMS = ('edit_content', 'add_content')
+
+
+class PermissionMatrix(object):
+    """
+    The ids of the categories and collections where a user was granted each
+    of the category based permissions.
+    """
+    def __init__(self, cat_perms=(), col_perms=()):
+        """
+        cat_perms and col_perms are (category or collection id, can edit
+        content, can add content) tuples.
+        """
+        self.categories = self._ids_by_perm(cat_perms)
+        self.collections = self._ids_by_perm(col_perms)
+
+    def _ids_by_perm(self, rows):
+        return dict((perm, frozenset(row[0] for row in rows if row[n + 1]))
+                    for n, perm in enumerate(PERMS))
+
+    def __nonzero__(self):
+        return any(self.categories.values()) or any(self.collections.values())
+
+    def has_perm(self, perm, categories):
+        """
+        Tells if perm was granted in any of categories, a list of (category
+        id, collection id) pairs.
+        """
+        category_ids = self.categories.get(perm, ())
+        collection_ids = self.collections.get(perm, ())
+        return any(category_id in category_ids or collection_id in collection_ids
+                   for category_id, collection_id in categories)
+
+def _build_matrix(user_obj):
+    fields = ('can_edit_content', 'can_add_content')
+    return PermissionMatrix(
+        CategoryPermission.objects.filter(user=user_obj).values_list('category', *fields),
+        CollectionPermission.objects.filter(user=user_obj).values_list('collection', *fields))
+
+def get_permission_matrix(user_obj):
+    """
+    Returns the PermissionMatrix of the user. It's kept in the user object,
+    which lives as long as the request, and in the cache until a category or
+    collection permission changes.
+    """
+    matrix = getattr(user_obj, '_category_perm_matrix', None)
+    if matrix is None:
+        if not user_obj.is_authenticated() or not user_obj.is_active:
+            matrix = PermissionMatrix()
+        else:
+            # the ids of deleted users may be reused
+            key = make_cache_key('cyclope_category_perms', user_obj.pk,
+                                 user_obj.date_joined, get_cache_version(PERMS_CACHE))
+            matrix = get_or_set_cache(_build_matrix, (user_obj,), {}, key,
+                                      cyc_settings.CYCLOPE_PERMS_CACHE_TIMEOUT)
+        user_obj._category_perm_matrix = matrix
+    return matrix
+
+def _get_categories(obj):
+    """Returns (category id, collection id) pairs of a Category or Collectible."""
+    if isinstance(obj, Category):
+        return [(obj.pk, obj.collection_id)]
+    if isinstance(obj, Collectible):
+        return Categorization.objects.get_for_object(obj).values_list(
+            'category', 'category__collection')
+    return []
+
+def has_global_perms(user_obj):
+    """Tells if the user may edit and add content in every category."""
+    return user_obj.is_authenticated() and (user_obj.is_superuser or
+           user_obj.is_staff and user_obj.has_perm('collections.change_category'))
+
+def filter_by_perm(user_obj, queryset, perm):
+    """
+    Returns the objects of queryset that user_obj has perm over, through a
+    permission on any of their categories or on its collection. The check
+    is done by the database as a subquery of the returned queryset.
+    """
+    if has_global_perms(user_obj):
+        return queryset
+    matrix = get_permission_matrix(user_obj)
+    category_ids = matrix.categories[perm]
+    collection_ids = matrix.collections[perm]
+    if not (category_ids or collection_ids):
+        return queryset.none()
+    object_ids = Categorization.objects.filter(
+        Q(category__in=category_ids) | Q(category__collection__in=collection_ids),
+        content_type=ContentType.objects.get_for_model(queryset.model)
+        ).values('object_id')
+    return queryset.filter(pk__in=object_ids)
 
 
 class CategoryPermBackend(object):
@@ -41,43 +135,23 @@ class CategoryPermBackend(object):
     def authenticate(self, username, password):
         return None
 
-    def _get_all_permissions(self, user_obj, obj=None):
-        """Returns a queryset of all CategoryPermissions a user has over a Category or Collectible"""
-        if obj is None or not user_obj.is_authenticated() or not user_obj.is_active:
-            return CategoryPermission.objects.none(), CategoryPermission.objects.none()
-        if issubclass(obj.__class__, Collectible):
-            categorizations = Categorization.objects.get_for_object(obj)
-            categories = [ c.category for c in categorizations ]
-        elif issubclass(obj.__class__, Category):
-            categories = [obj]
-
-        cat_perms = CategoryPermission.objects.filter(category__in=categories, user=user_obj)
-        collections = [ c.collection for c in categories ]
-        col_perms = CollectionPermission.objects.filter(collection__in=collections, user=user_obj)
-        return cat_perms, col_perms
-
     def get_all_permissions(self, user_obj, obj=None):
         """Returns a dictionary of permissions a user has over a Category or Collectible"""
         perms_dict = { "edit_content": False, "add_content": False}
-        if user_obj.is_authenticated() and (user_obj.is_superuser or
-           user_obj.is_staff and user_obj.has_perm('collections.change_category')):
+        if has_global_perms(user_obj):
             perms_dict["edit_content"] = True
             perms_dict["add_content"] = True
-        else:
+        elif obj is not None:
         # check for permissions per category and collection
-            cat_perms, col_perms = self._get_all_permissions(user_obj, obj)
-            if cat_perms or col_perms:
-                for perm in ['edit_content', 'add_content']:
-                    condition = {'can_%s' % perm: True}
-                    perms_dict[perm] = cat_perms.filter(**condition).exists() or \
-                                       col_perms.filter(**condition).exists()
+            matrix = get_permission_matrix(user_obj)
+            if matrix:
+                categories = _get_categories(obj)
+                for perm in PERMS:
+                    perms_dict[perm] = matrix.has_perm(perm, categories)
         return perms_dict
 
     def has_perm(self, user_obj, perm, obj=None):
         if obj is None:
             return False
-        cat_perms, col_perms = self._get_all_permissions(user_obj, obj)
-        condition = {'can_%s' % perm: True}
-
-        return cat_perms.filter(**condition).exists() or col_perms.filter(**condition).exists()
-        
+        matrix = get_permission_matrix(user_obj)
+        return bool(matrix) and matrix.has_perm(perm, _get_categories(obj))
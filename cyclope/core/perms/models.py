@@ -25,10 +25,15 @@ core.perms.models
 """
 
 from django.db import models
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.models import User
 from django.utils.translation import ugettext_lazy as _
 
 from cyclope.core.collections.models import Category, Collection
+from cyclope.utils import bump_cache_version
+
+# name of the cache version of the users permission matrices
+PERMS_CACHE = 'category_perms'
 
 
 class CategoryPermission(models.Model):
@@ -52,3 +57,16 @@ class CollectionPermission(models.Model):
         unique_together = ('collection', 'user')
         verbose_name = _('collection permission')
         verbose_name_plural = _('collection permissions')
+
+
+def _invalidate_perms(sender, instance, **kwargs):
+    bump_cache_version(PERMS_CACHE)
+
+post_save.connect(_invalidate_perms, sender=CategoryPermission,
+                  dispatch_uid="cyclope.perms.category_perms.save")
+post_delete.connect(_invalidate_perms, sender=CategoryPermission,
+                    dispatch_uid="cyclope.perms.category_perms.delete")
+post_save.connect(_invalidate_perms, sender=CollectionPermission,
+                  dispatch_uid="cyclope.perms.collection_perms.save")
+post_delete.connect(_invalidate_perms, sender=CollectionPermission,
+                    dispatch_uid="cyclope.perms.collection_perms.delete")
@@ -24,7 +24,7 @@ from django.template.loader import render_to_string
 from profiles.utils import get_profile_model
 
 from cyclope.core import frontend
-from cyclope.frontend_views import AuthoredMixin
+from cyclope.frontend_views import AuthoredMixin, authored_querysets
 
 
 
@@ -39,20 +39,14 @@ class UserDetail(AuthoredMixin, frontend.FrontendView):
     is_content_view = True
     template = "user_profiles/profile_detail.html"
 
-    def get_queryset(self, content_object):
-        qs = []
-        # get related methods like picture_set, article_set, etc.
-        # checking that are BaseContent types
-        for related_name in dir(content_object):
-            if related_name.endswith('_set'):
-                rel_set = getattr(content_object, related_name)
-                if rel_set.model in frontend.site.base_content_types:
-                    sqs = rel_set.all()
-                    # We only want the items that doesn't have author set
-                    if hasattr(rel_set.model, "author"):
-                        sqs = sqs.filter(author=None)
-                    qs.extend(sqs)
-        return qs
+    def get_querysets(self, content_object):
+        querysets = []
+        for qs in authored_querysets(content_object):
+            # We only want the items that doesn't have author set
+            if hasattr(qs.model, "author"):
+                qs = qs.filter(author=None)
+            querysets.append(qs)
+        return querysets
 
     def get_response(self, request, req_context, options, content_object):
         if options['show_authored_content']:
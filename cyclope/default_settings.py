@@ -60,6 +60,7 @@ TEMPLATE_CONTEXT_PROCESSORS = (
     "django.contrib.messages.context_processors.messages",
     "django.core.context_processors.request",
     "cyclope.core.context_processors.site_settings",
+    "cyclope.core.context_processors.layout",
     "cyclope.core.context_processors.compressor",
 )
 
@@ -71,6 +72,7 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'cyclope.middleware.LayoutMiddleware',
+    'cyclope.middleware.PageCacheMiddleware',
 #    'debug_toolbar.middleware.DebugToolbarMiddleware',
 )
 
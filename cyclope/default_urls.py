@@ -31,16 +31,15 @@ from haystack.views import SearchView, search_view_factory
 from cyclope.core.captcha_contact_form.forms import AdminSettingsContactFormWithCaptcha
 import cyclope.settings as cyc_settings
 from cyclope.feeds import CategoryFeed, WholeSiteFeed, ContentTypeFeed
-from cyclope.sitemaps import CategorySitemap, CollectionSitemap, MenuSitemap
 from cyclope.core.user_profiles.forms import UserProfileForm
 from cyclope.forms import DateSearchForm, ModelSearchForm
 from cyclope.views import delete_regionview
 from django.conf.urls.static import static
 
 urlpatterns = patterns('',
-    url(r'^sitemap\.xml$', 'django.contrib.sitemaps.views.sitemap',
-        {'sitemaps': {"menus": MenuSitemap, "categories": CategorySitemap,
-                      "collections": CollectionSitemap}}),
+    url(r'^sitemap\.xml$', 'cyclope.sitemaps.index', name='sitemap_index'),
+    url(r'^sitemap-(?P<section>\w+)\.xml$', 'cyclope.sitemaps.section',
+        name='sitemap_section'),
     url(r'^robots\.txt$', 'django.views.generic.simple.direct_to_template',
         {'template': 'cyclope/robots.txt', 'mimetype': 'text/plain'}),
 
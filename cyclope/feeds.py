@@ -19,19 +19,67 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import time
+import hashlib
+from itertools import islice
+
 from django.contrib.syndication.views import Feed
 from django.shortcuts import get_object_or_404
-from django.http import Http404
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
 from cyclope.core.collections.models import Category
-from cyclope.models import SiteSettings
+from cyclope.models import FEEDS_CACHE
+from cyclope.utils import (prefetch_content_objects, select_related_fields,
+                           merge_sorted, get_cache_version, make_cache_key)
 import cyclope.settings as cyc_settings
 import cyclope.core.frontend.sites as sites
 
+
+def _latest(model, limit):
+    queryset = model.objects.filter(published=True).order_by('-creation_date')
+    return select_related_fields(queryset, ('author',))[:limit]
+
+
 class WholeSiteFeed(Feed):
+    """
+    The rendered feeds are cached until a content, a categorization or the
+    site settings change, and served with ETag and Last-Modified headers so
+    conditional requests get a 304 response.
+    """
 
     description_template = 'feeds/description.html'
 
+    def __call__(self, request, *args, **kwargs):
+        key = make_cache_key('feed', self.__class__.__name__, args, kwargs,
+                             get_cache_version(FEEDS_CACHE))
+        cached = cache.get(key)
+        if cached is None:
+            response = super(WholeSiteFeed, self).__call__(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cached = (response.content, response['Content-Type'],
+                      quote_etag(hashlib.md5(response.content).hexdigest()),
+                      int(time.time()))
+            cache.set(key, cached, cyc_settings.CYCLOPE_RSS_CACHE_TIMEOUT)
+        content, content_type, etag, last_modified = cached
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if if_none_match is not None:
+            not_modified = etag in [tag.strip() for tag in if_none_match.split(',')]
+        else:
+            not_modified = if_modified_since and if_modified_since >= last_modified
+        if not_modified:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
     def title(self, obj):
         return cyc_settings.CYCLOPE_SITE_SETTINGS.global_title
 
@@ -55,10 +103,11 @@ class WholeSiteFeed(Feed):
 
     def items(self):
         N = cyc_settings.CYCLOPE_RSS_LIMIT
-        objs = []
-        for ctype in SiteSettings.objects.get().rss_content_types.all():
-            objs.extend(list(ctype.model_class().objects.filter(published=True)[:N]))
-        return sorted(objs, key=lambda x: x.creation_date, reverse = True)[:N]
+        site_settings = cyc_settings.CYCLOPE_SITE_SETTINGS
+        models = [ctype.model_class() for ctype in site_settings.rss_content_types.all()]
+        latest = [_latest(model, N) for model in models if model is not None]
+        return list(islice(merge_sorted(latest, lambda x: x.creation_date,
+                                        reverse=True), N))
 
 class ContentTypeFeed(WholeSiteFeed):
 
@@ -76,8 +125,7 @@ class ContentTypeFeed(WholeSiteFeed):
         return reverse('content_type_feed', args=[model.get_object_name()])
 
     def items(self, model):
-        N = cyc_settings.CYCLOPE_RSS_LIMIT
-        return model.objects.filter(published=True).order_by('-creation_date')[:N]
+        return _latest(model, cyc_settings.CYCLOPE_RSS_LIMIT)
 
 class CategoryFeed(WholeSiteFeed):
 
@@ -93,8 +141,7 @@ class CategoryFeed(WholeSiteFeed):
 
     def items(self, category):
         N = cyc_settings.CYCLOPE_RSS_LIMIT
-        objs = []
-        for c in category.categorizations.all():
-            if c.content_object.published:
-              objs.append(c.content_object)
-        return sorted(objs, key=lambda x: x.creation_date, reverse = True)[:N]
+        categorizations = category.categorizations.filter(
+            object_published=True).order_by('-object_creation_date')[:N]
+        return [c.content_object for c in prefetch_content_objects(categorizations)
+                if c.content_object is not None]
@@ -23,7 +23,7 @@
 cyclope.frontend_views
 ----------------------
 """
-from operator import attrgetter
+from collections import defaultdict
 
 from django import forms
 from django.utils.translation import ugettext_lazy as _
@@ -33,11 +33,34 @@ from django.contrib.comments.models import Comment
 from django.template.loader import render_to_string
 
 import cyclope.utils
-from cyclope.utils import HyerarchyBuilderMixin
+from cyclope.utils import (HyerarchyBuilderMixin, get_tree_children,
+                           annotate_has_content, get_or_set_cache,
+                           get_cache_version, make_cache_key)
 from cyclope import settings as cyc_settings
 from cyclope.core import frontend
 from cyclope.core.collections.models import Collection, Category
-from cyclope.models import Menu, MenuItem, Author
+from cyclope.models import Menu, MenuItem, Author, menu_cache_name
+
+
+def get_cached_menu(menu, name, func):
+    """
+    Returns the result of func, cached under name until the menu or any of
+    its items change.
+    """
+    key = make_cache_key('cyclope_menu', menu.pk, name,
+                         get_cache_version(menu_cache_name(menu.pk)))
+    return get_or_set_cache(func, (), {}, key, cyc_settings.CYCLOPE_MENU_CACHE_TIMEOUT)
+
+def _mark_current(nested_list, entry, current_entry):
+    """Returns a copy of nested_list with entry replaced by current_entry."""
+    marked = []
+    for value in nested_list:
+        if isinstance(value, list):
+            value = _mark_current(value, entry, current_entry)
+        elif value == entry:
+            value = current_entry
+        marked.append(value)
+    return marked
 
 
 class MenuRootItemsList(frontend.FrontendView):
@@ -50,8 +73,8 @@ class MenuRootItemsList(frontend.FrontendView):
     template = "cyclope/menu_flat_items_list.html"
 
     def get_response(self, request, req_context, options, content_object):
-        menu_items = MenuItem.tree.filter(menu=content_object,
-                                          level=0, active=True)
+        menu_items = get_cached_menu(content_object, self.name, lambda: list(
+            MenuItem.tree.filter(menu=content_object, level=0, active=True)))
         current_url = request.path_info[1:].split('/')[0]
         return render_to_string(self.template, {
             'menu_items': menu_items,
@@ -71,7 +94,8 @@ class MenuFlatItemsList(frontend.FrontendView):
     template = "cyclope/menu_flat_items_list.html"
 
     def get_response(self, request, req_context, options, content_object):
-        menu_items = MenuItem.tree.filter(menu=content_object, active=True)
+        menu_items = get_cached_menu(content_object, self.name, lambda: list(
+            MenuItem.tree.filter(menu=content_object, active=True)))
         current_url = request.path_info[1:].split('/')[0]
         return render_to_string(self.template, {
             'menu_items': menu_items,
@@ -103,13 +127,13 @@ class MenuMenuItemsHierarchy(frontend.FrontendView, HyerarchyBuilderMixin):
 
     def get_response(self, request, req_context, options, content_object):
         menu = content_object
-        menu_items = MenuItem.tree.filter(menu=menu, level=0, active=True)
+        menu_items_list, menu_items_objs, current_entries = get_cached_menu(
+            menu, '%s:%s' % (self.name, self.template_item),
+            lambda: self.build_menu(menu))
         current_url = request.path_info[1:]
-        menu_items_list = []
-        for item in menu_items:
-            value = self.make_nested_list(item, True, current_url)
-            menu_items_list.extend(value)
-        menu_items_objs = [ (item, item.get_leafnodes()) for item in menu_items ]
+        if current_url in current_entries:
+            menu_items_list = _mark_current(menu_items_list,
+                                            *current_entries[current_url])
 
         return render_to_string(self.template, {
             'menu_items_list': menu_items_list,
@@ -118,6 +142,33 @@ class MenuMenuItemsHierarchy(frontend.FrontendView, HyerarchyBuilderMixin):
             'expand_style': options["align"]
         }, req_context)
 
+    def build_menu(self, menu):
+        """
+        Returns the nested list of the menu rendered without a current item,
+        its root items with their leaves and, by url, the entry of each item in
+        the nested list along with the entry that marks it as current.
+        """
+        # the whole menu is loaded in one query and walked in memory
+        nodes = list(MenuItem.tree.filter(menu=menu).order_by('tree_id', 'lft'))
+        children = get_tree_children(nodes)
+        menu_items = [item for item in children[None] if item.active]
+        menu_items_list = []
+        for item in menu_items:
+            menu_items_list.extend(
+                self.make_nested_list_from_tree(item, children, True, None))
+        menu_items_objs = [(item, [node for node in nodes
+                                   if node.tree_id == item.tree_id
+                                   and node.lft > item.lft and node.is_leaf_node()])
+                           for item in menu_items]
+        current_entries = {}
+        for node in nodes:
+            if node.active:
+                current_entries[node.url] = (
+                    (self.render_item(node, None), self.item_classes(node)),
+                    (self.render_item(node, node.url),
+                     self.item_classes(node, node.url)))
+        return menu_items_list, menu_items_objs, current_entries
+
     def render_item(self, item, current_url):
         has_children = 'has_children' if item.get_descendant_count() \
                        else 'no_children'
@@ -184,24 +235,38 @@ class SiteMap(frontend.FrontendView, HyerarchyBuilderMixin):
     template = "cyclope/site_map.html"
 
     def get_response(self, request, req_context, options):
+        # each tree is loaded in a single query and walked in memory
+        categories = annotate_has_content(
+            Category.tree.filter(collection__visible=True)).order_by('tree_id', 'lft')
+        category_children = get_tree_children(categories)
+        root_categories = defaultdict(list)
+        for category in category_children[None]:
+            root_categories[category.collection_id].append(category)
+
         collections_list = []
         for collection in Collection.objects.filter(visible=True):
             category_list = []
-            for category in Category.tree.filter(collection=collection, level=0):
-                # TODO(diegoM): Change this line when the refactorization is done
-                category_list.extend(self._get_categories_nested_list(category))
+            for category in root_categories[collection.pk]:
+                category_list.extend(self._get_categories_nested_list(
+                    category, children=category_children))
             if category_list:
                 collections_list.extend([collection,category_list])
             else:
                 collections_list.append(collection)
 
+        item_children = get_tree_children(
+            MenuItem.tree.order_by('tree_id', 'lft'))
+        root_items = defaultdict(list)
+        for item in item_children[None]:
+            root_items[item.menu_id].append(item)
+
+        menus_hierarchy = MenuMenuItemsHierarchy()
         menus_list = []
         for menu in Menu.objects.all():
             menu_items_list = []
-            for item in MenuItem.tree.filter(menu=menu, level=0):
-                # TODO(diegoM): Change this line when the refactorization is done
-                menu_items_list.extend(
-                    MenuMenuItemsHierarchy().make_nested_list(item, False, None))
+            for item in root_items[menu.pk]:
+                menu_items_list.extend(menus_hierarchy.make_nested_list_from_tree(
+                    item, item_children, False, None))
             if menu_items_list:
                 menus_list.extend([menu.name, menu_items_list])
             else:
@@ -242,30 +307,45 @@ class AuthorDetailOptions(forms.Form):
                                        ("ALPHABETIC", _(u"Alphabetic"))),
                               initial="DATE-")
 
+def authored_querysets(obj):
+    """
+    Returns a queryset per content type of the contents related to obj, like
+    an Author or a User, through a foreign key.
+    """
+    return [getattr(obj, related.get_accessor_name()).all()
+            for related in obj._meta.get_all_related_objects()
+            if related.model in frontend.site.base_content_types]
+
+
 class AuthoredMixin(object):
 
     options_form = AuthorDetailOptions
 
-    def get_queryset(self, content_object):
-        "Must return a queryset with all objects 'authored' by content_object"
-        return NotImplementedError
+    def get_querysets(self, content_object):
+        "Must return a queryset per content type of the objects 'authored' by content_object"
+        raise NotImplementedError
 
     def get_page(self, request, req_context, options, content_object):
         from cyclope.core.collections.frontend_views import SORT_BY
-        qs = self.get_queryset(content_object)
+        querysets = self.get_querysets(content_object)
 
         sort_by = options["sort_by"]
         limit = options["limit_to_n_items"] or None
         sort_property, reverse, paginator_class = SORT_BY[sort_by]
         paginator_kwargs = {"per_page": options["items_per_page"]}
-        if 'DATE' in sort_by:
-            qs.sort(key=attrgetter(sort_property), reverse=reverse)
-            if limit:
-                qs = qs[:limit]
-        elif 'ALPHABETIC' in sort_by:
-            paginator_kwargs['on'] = "name"
-        paginator = paginator_class(qs, **paginator_kwargs)
-        page = cyclope.utils.get_page(paginator, request)
+        if 'ALPHABETIC' in sort_by:
+            # the pages are grouped by initial so every name is read, but the
+            # objects are only loaded for the current page
+            contents = cyclope.utils.MergedQuerySets(querysets, 'name')
+            paginator = paginator_class(list(contents.entries()), on='value',
+                                        **paginator_kwargs)
+            page = cyclope.utils.get_page(paginator, request)
+            page.object_list = contents.load(page.object_list)
+        else:
+            contents = cyclope.utils.MergedQuerySets(querysets, sort_property,
+                                                     reverse, limit)
+            paginator = paginator_class(contents, **paginator_kwargs)
+            page = cyclope.utils.get_page(paginator, request)
         return page
 
 
@@ -280,14 +360,8 @@ class AuthorDetail(AuthoredMixin, frontend.FrontendView):
     is_content_view = True
     template = "cyclope/author_detail.html"
 
-    def get_queryset(self, content_object):
-        authored_content = []
-        # get related methods like picture_set, article_set, etc.
-        related = [attribute for attribute in dir(content_object) \
-                   if attribute.endswith('_set')]
-        for n in related:
-            authored_content.extend(getattr(content_object, n).all())
-        return authored_content
+    def get_querysets(self, content_object):
+        return authored_querysets(content_object)
 
     def get_response(self, request, req_context, options, content_object):
         if options['show_authored_content']:
@@ -312,6 +386,7 @@ class AuthorTeaser(frontend.FrontendView):
     is_instance_view = False
     is_region_view = True
     is_content_view = True
+    region_cache_timeout = cyc_settings.CYCLOPE_REGION_CACHE_TIMEOUT
     template = "cyclope/author_teaser.html"
 
     def get_response(self, request, req_context, options):
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010-2013 Código Sur Sociedad Civil.
+# All rights reserved.
+#
+# This file is part of Cyclope.
+#
+# Cyclope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Cyclope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Outgoing mail queue
+-------------------
+
+Messages sent through QueuedEmailBackend are stored as QueuedMail rows and
+delivered by send_queued_mail, using the EMAIL_BACKEND setting and one
+connection per batch. Failed deliveries are retried with an exponential
+backoff and marked as failed after CYCLOPE_MAIL_MAX_ATTEMPTS.
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.utils.encoding import force_unicode
+
+import cyclope.settings as cyc_settings
+from cyclope.models import QueuedMail
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """An email backend that adds the messages to the outgoing mail queue."""
+
+    def send_messages(self, email_messages):
+        count = 0
+        for message in email_messages:
+            if message.recipients():
+                enqueue(message)
+                count += 1
+        return count
+
+
+def get_connection():
+    """Returns a connection that queues the messages instead of sending them."""
+    return mail.get_connection('cyclope.mail_queue.QueuedEmailBackend')
+
+def enqueue(message):
+    """Adds an EmailMessage to the queue."""
+    message.connection = None
+    message.subject = force_unicode(message.subject)
+    message.body = force_unicode(message.body)
+    queued = QueuedMail(subject=message.subject[:255],
+                        recipients=u', '.join(message.recipients()))
+    queued.set_message(message)
+    queued.save()
+    return queued
+
+def _defer(queued, error, now):
+    queued.attempts += 1
+    queued.last_error = force_unicode(repr(error))
+    if queued.attempts >= cyc_settings.CYCLOPE_MAIL_MAX_ATTEMPTS:
+        queued.status = 'failed'
+    else:
+        delay = cyc_settings.CYCLOPE_MAIL_RETRY_DELAY * 2 ** (queued.attempts - 1)
+        queued.next_attempt = now + timedelta(seconds=delay)
+    queued.save()
+    return queued.status
+
+def send_queued_mail(batch_size=100, connection=None):
+    """
+    Sends the oldest batch_size queued messages that are due over a single
+    connection.
+
+    Returns a dict with the number of sent, retried and failed messages.
+    """
+    now = datetime.now()
+    batch = QueuedMail.objects.filter(status='queued', next_attempt__lte=now)
+    batch = list(batch.order_by('id')[:batch_size])
+    stats = {'sent': 0, 'retried': 0, 'failed': 0}
+    if not batch:
+        return stats
+    if connection is None:
+        connection = mail.get_connection()
+    opened = False
+    try:
+        for queued in batch:
+            if not opened:
+                try:
+                    connection.open()
+                except Exception, error:
+                    # the server is unreachable, the batch waits without
+                    # spending the attempts of its messages
+                    logger.warning("Error connecting to the mail server: %r", error)
+                    break
+                opened = True
+            try:
+                connection.send_messages([queued.get_message()])
+            except Exception, error:
+                if _defer(queued, error, now) == 'failed':
+                    stats['failed'] += 1
+                else:
+                    stats['retried'] += 1
+                # starts over with a new connection
+                connection.close()
+                opened = False
+            else:
+                queued.delete()
+                stats['sent'] += 1
+    finally:
+        if opened:
+            connection.close()
+    return stats
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+from optparse import make_option
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.db.models import Min, Max
+from django.db.models.loading import get_model
+from haystack import site
+from haystack.constants import DJANGO_CT
+
+from cyclope.search_indexes import uses_whoosh, whoosh_backend, prepare_document
+
+
+def _drop_connection():
+    # forked workers open their own database connection. Closing the
+    # inherited one would close it for the parent too
+    connection.connection = None
+
+def _prepare_shard(shard):
+    """Returns the documents of the objects of a model in a pk range."""
+    app_label, module_name, start, end = shard
+    index = site.get_index(get_model(app_label, module_name))
+    objects = index.index_queryset().filter(pk__gte=start, pk__lt=end)
+    docs = [prepare_document(index, obj) for obj in objects.iterator()]
+    reset_queries()
+    return end, docs
+
+def _model_label(model):
+    return '%s.%s' % (model._meta.app_label, model._meta.module_name)
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the search index using several processes'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--workers',
+            action='store',
+            type='int',
+            dest='workers',
+            default=4,
+            help='Number of processes that render the documents, 0 renders them in this process'
+        ),
+        make_option('--chunk-size',
+            action='store',
+            type='int',
+            dest='chunk_size',
+            default=1000,
+            help='Size of the pk range rendered and committed at once'
+        ),
+        make_option('--checkpoint',
+            action='store',
+            dest='checkpoint',
+            default=None,
+            help='File where the progress is saved, defaults to a file next to the index'
+        ),
+        make_option('--restart',
+            action='store_true',
+            dest='restart',
+            default=False,
+            help='Ignore the saved progress and reindex everything'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if not uses_whoosh():
+            raise CommandError('cyclope_reindex only supports the Whoosh search engine.')
+        path = options['checkpoint'] or \
+            os.path.normpath(settings.HAYSTACK_WHOOSH_PATH) + '.reindex.json'
+        progress = {}
+        if os.path.exists(path) and not options['restart']:
+            with open(path) as f:
+                progress = json.load(f)
+            self.stdout.write('Resuming from %s\n' % path)
+
+        pool = None
+        if options['workers'] > 0:
+            pool = Pool(options['workers'], initializer=_drop_connection)
+        try:
+            backend = whoosh_backend()
+            for model in site.get_indexed_models():
+                self.reindex_model(backend, model, progress, path,
+                                   options['chunk_size'], pool)
+            # merges the segments written for each chunk
+            backend.index.optimize()
+        finally:
+            if pool is not None:
+                pool.terminate()
+        if os.path.exists(path):
+            os.remove(path)
+
+    def reindex_model(self, backend, model, progress, path, chunk_size, pool):
+        label = _model_label(model)
+        if progress.get(label) is True:
+            self.stdout.write('%s: already indexed\n' % label)
+            return
+        queryset = site.get_index(model).index_queryset()
+        bounds = queryset.aggregate(first=Min('pk'), last=Max('pk'))
+        start = progress.get(label)
+        writer = backend.index.writer()
+        if start is None:
+            start = bounds['first']
+            writer.delete_by_term(DJANGO_CT, label)
+        shards = []
+        if start is not None and bounds['last'] is not None:
+            shards = [(model._meta.app_label, model._meta.module_name,
+                       low, low + chunk_size)
+                      for low in xrange(start, bounds['last'] + 1, chunk_size)]
+        if pool is not None:
+            results = pool.imap(_prepare_shard, shards)
+        else:
+            results = (_prepare_shard(shard) for shard in shards)
+
+        began, count = time.time(), 0
+        for end, docs in results:
+            for doc in docs:
+                writer.update_document(**doc)
+            writer.commit(merge=False)
+            count += len(docs)
+            self.save_progress(path, progress, label, end)
+            writer = backend.index.writer()
+        writer.commit(merge=False)
+        self.save_progress(path, progress, label, True)
+        elapsed = time.time() - began
+        self.stdout.write('%s: %d documents in %.1fs (%.1f docs/s)\n' % (
+            label, count, elapsed, count / elapsed if elapsed else 0))
+
+    def save_progress(self, path, progress, label, value):
+        """Stores the next pk to index of label, or True when it's done."""
+        progress[label] = value
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(progress, f)
+        os.rename(tmp_path, path)
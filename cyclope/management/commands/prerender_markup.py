@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from cyclope.core import frontend
+from cyclope.utils.markup import prerender, renderer_service
+
+class Command(BaseCommand):
+    help = 'Renders the texts of all the contents and stores them in the cache'
+
+    def handle(self, *args, **options):
+        frontend.autodiscover()
+        for model in frontend.site.base_content_types:
+            for instance in model.objects.iterator():
+                prerender(instance)
+            self.stdout.write('%s rendered\n' % model._meta.object_name)
+        stats = renderer_service.get_stats()
+        self.stdout.write('%(renders)d renders in %(render_time).1fs, '
+                          '%(timeouts)d timeouts, %(errors)d errors\n' % stats)
@@ -0,0 +1,50 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import transaction, reset_queries
+
+from cyclope.search_indexes import process_search_queue
+
+class Command(BaseCommand):
+    help = 'Applies the pending search index updates'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size',
+            action='store',
+            type='int',
+            dest='batch_size',
+            default=500,
+            help='Number of queued updates applied in each batch'
+        ),
+        make_option('--sleep',
+            action='store',
+            type='float',
+            dest='sleep',
+            default=2,
+            help='Seconds to wait when the queue is empty'
+        ),
+        make_option('--once',
+            action='store_true',
+            dest='once',
+            default=False,
+            help='Exit when the queue is empty instead of waiting for updates'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.time()
+            stats = process_search_queue(options['batch_size'])
+            if stats['processed']:
+                stats['time'] = time.time() - start
+                self.stdout.write('%(processed)d queued updates: %(updated)d updated, '
+                                  '%(deleted)d deleted in %(time).2fs, '
+                                  'lag %(lag).1fs\n' % stats)
+            elif options['once']:
+                break
+            else:
+                # ends the transaction so the next read sees new rows
+                transaction.commit_unless_managed()
+                time.sleep(options['sleep'])
+            reset_queries()
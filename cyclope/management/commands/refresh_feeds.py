@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from cyclope.apps.feeds.models import Feed
+from cyclope.apps.feeds.fetcher import refresh_feeds
+
+class Command(BaseCommand):
+    help = 'Fetches all the Feeds and stores their entries in the cache'
+
+    def handle(self, *args, **options):
+        urls = list(Feed.objects.values_list('url', flat=True))
+        for url, stored in zip(urls, refresh_feeds(urls)):
+            self.stdout.write('%s: %d entries\n' % (url, len(stored['entries'])))
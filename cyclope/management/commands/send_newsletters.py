@@ -0,0 +1,46 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import transaction, reset_queries
+
+from cyclope.apps.newsletter.delivery import deliver_queued
+
+class Command(BaseCommand):
+    help = 'Sends the queued newsletter deliveries'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size',
+            action='store',
+            type='int',
+            dest='batch_size',
+            default=None,
+            help='Number of recipients mailed over each connection'
+        ),
+        make_option('--sleep',
+            action='store',
+            type='float',
+            dest='sleep',
+            default=10,
+            help='Seconds to wait when there is nothing to send'
+        ),
+        make_option('--once',
+            action='store_true',
+            dest='once',
+            default=False,
+            help='Exit when there is nothing to send instead of waiting'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        while True:
+            sent = deliver_queued(options['batch_size'])
+            if sent:
+                self.stdout.write('%d newsletters sent\n' % sent)
+            else:
+                if options['once']:
+                    break
+                # ends the transaction so the next read sees new rows
+                transaction.commit_unless_managed()
+                time.sleep(options['sleep'])
+            reset_queries()
@@ -0,0 +1,47 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import transaction, reset_queries
+
+from cyclope.mail_queue import send_queued_mail
+
+class Command(BaseCommand):
+    help = 'Sends the queued mail'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size',
+            action='store',
+            type='int',
+            dest='batch_size',
+            default=100,
+            help='Number of messages sent over each connection'
+        ),
+        make_option('--sleep',
+            action='store',
+            type='float',
+            dest='sleep',
+            default=5,
+            help='Seconds to wait when there is no mail to send'
+        ),
+        make_option('--once',
+            action='store_true',
+            dest='once',
+            default=False,
+            help='Exit when there is no mail to send instead of waiting for it'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        while True:
+            stats = send_queued_mail(options['batch_size'])
+            if any(stats.values()):
+                self.stdout.write('%(sent)d sent, %(retried)d to retry, '
+                                  '%(failed)d failed\n' % stats)
+            if not stats['sent']:
+                if options['once']:
+                    break
+                # ends the transaction so the next read sees new rows
+                transaction.commit_unless_managed()
+                time.sleep(options['sleep'])
+            reset_queries()
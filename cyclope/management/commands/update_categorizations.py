@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from cyclope.core.collections.models import Categorization
+
+class Command(BaseCommand):
+    help = ('Copies the name, dates and published state of the categorized '
+            'contents to their Categorizations')
+
+    def handle(self, *args, **options):
+        updated = Categorization.objects.update_all_object_fields()
+        self.stdout.write('%d categorizations updated\n' % updated)
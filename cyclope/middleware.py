@@ -21,31 +21,101 @@
 
 class LayoutMiddleware(object):
     """
-    Sets session['layout'] if the current menu item has a persistent layout
-    and clears it when another menu_item changes the layout.
+    Sets request.page_context, where the menu item, layout and site settings
+    for the request are resolved once.
+
+    Sets session['layout'] to the id of the layout if the current menu item
+    has a persistent layout and clears it when another menu_item changes the
+    layout. The session is only modified when the layout changes.
+
+    The template of the layout reaches the templates of external apps as
+    layout_template, through the cyclope.core.context_processors.layout
+    context processor.
     """
     def process_request(self, request):
         import cyclope # Leave this here, it prevents circular imports
         import cyclope.settings # Leave this here
 
-        menu_item = cyclope.utils.menu_item_for_request(request)
+        page_context = cyclope.utils.get_page_context(request)
+        menu_item = page_context.menu_item
         if menu_item:
             ## we force the layout for items with custom URL (external apps)
             ## so they can use the correct template to extend from
             if menu_item.persistent_layout or menu_item.custom_url:
                 layout = menu_item.get_layout()
-                request.session['layout'] = layout
-                request.session['layout_template'] = layout.get_template_path()
+                if request.session.get('layout') != layout.pk:
+                    request.session['layout'] = layout.pk
 
             else:
                 if request.session.has_key('layout'):
                     del request.session['layout']
+
+
+class PageCacheMiddleware(object):
+    """
+    Caches the pages rendered for anonymous users for
+    CYCLOPE_PAGE_CACHE_TIMEOUT seconds (0 disables the cache). Only pages
+    tagged by the frontend views are cached, and they are discarded when any
+    of their tags is purged (see cyclope.page_cache).
+    Must be placed after the LayoutMiddleware.
+    """
+    def _cache_key(self, request):
+        from django.utils.translation import get_language
+        from cyclope.utils import make_cache_key
+        return make_cache_key('cyclope_page', request.get_host(),
+                              request.get_full_path(), request.is_secure(),
+                              get_language(), request.session.get('layout'))
+
+    def process_request(self, request):
+        from django.core.cache import cache
+        from django.http import HttpResponse, HttpResponseNotModified
+        from cyclope.page_cache import tags_are_current, get_timeout
+
+        user = getattr(request, 'user', None)
+        if not get_timeout() or \
+               request.method not in ('GET', 'HEAD') or user is None or \
+               user.is_authenticated() or 'messages' in request.COOKIES:
+            return None
+        request._page_cache_key = self._cache_key(request)
+        page = cache.get(request._page_cache_key)
+        if page is None or not tags_are_current(page['tags']):
+            return None
+
+        request._page_cache_hit = True
+        etag = dict(page['headers']).get('ETag')
+        if etag and request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponseNotModified()
         else:
-            ## if no layout_template has been set we set it to the default so external apps'
-            ## templates that extend from request.session.layout_template won't break
-            ## even when accessed through a direct URL
-            if not 'layout_template' in request.session and \
-                   hasattr(cyclope.settings, 'CYCLOPE_DEFAULT_TEMPLATE'):
-                request.session['layout_template'] = cyclope.settings.CYCLOPE_DEFAULT_TEMPLATE
+            response = HttpResponse(page['content'], content_type=page['content_type'])
+        for header, value in page['headers']:
+            response[header] = value
+        return response
+
+    def process_response(self, request, response):
+        from django.core.cache import cache
+        from cyclope.utils import get_page_context
+        from cyclope.page_cache import (add_page_tags, get_tag_versions,
+                                        object_tag, SITE_TAG, get_timeout)
+
+        key = getattr(request, '_page_cache_key', None)
+        if key is None or getattr(request, '_page_cache_hit', False) or \
+               not getattr(request, 'page_cache_tags', None) or \
+               request.method != 'GET' or response.status_code != 200 or \
+               response.cookies or request.META.get('CSRF_COOKIE_USED') or \
+               response._base_content_is_iter:
+            return response
 
+        page_context = get_page_context(request)
+        add_page_tags(request, SITE_TAG, object_tag(page_context.layout))
+        if page_context.menu_item:
+            add_page_tags(request, object_tag(page_context.menu_item))
+        headers = [(header, response[header])
+                   for header in ('ETag', 'Last-Modified', 'Cache-Control')
+                   if response.has_header(header)]
+        cache.set(key, {'content': response.content,
+                        'content_type': response['Content-Type'],
+                        'headers': headers,
+                        'tags': get_tag_versions(request.page_cache_tags)},
+                  get_timeout())
+        return response
 
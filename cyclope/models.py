@@ -25,7 +25,11 @@ models
 """
 
 from datetime import datetime
+from collections import defaultdict
+import operator
 import os
+import base64
+import cPickle as pickle
 
 from django.db import models
 from django.db.models import get_model
@@ -38,7 +42,8 @@ from django.contrib.sites.models import Site
 from django.core.exceptions import ObjectDoesNotExist
 from django.conf import settings
 from django.contrib.admin.models import LogEntry
-from django.db.models.signals import pre_delete
+from django.db.models.signals import (pre_delete, pre_save, post_save, post_delete,
+                                      m2m_changed, class_prepared)
 
 from rosetta.poutil import find_pos
 import mptt
@@ -47,9 +52,22 @@ from filebrowser.fields import FileBrowseField
 from jsonfield import JSONField
 
 import cyclope
-from cyclope.core.collections.models import Collection, Collectible
-from cyclope.utils import (ThumbnailMixin, get_singleton,
-                            get_object_name, get_app_label)
+from cyclope.core.collections.models import (Collection, Category,
+                                             Categorization, Collectible)
+from cyclope.utils import (ThumbnailMixin, get_singleton, bump_cache_version,
+                            get_cache_version, get_object_name, get_app_label)
+
+# name of the cache version of the region views output
+REGION_CACHE = 'region'
+
+# name of the cache version of the layout registry
+LAYOUTS_CACHE = 'layouts'
+
+# name of the cache version of the rendered site feeds
+FEEDS_CACHE = 'feeds'
+
+# name of the cache version bumped when a comment changes
+COMMENTS_CACHE = 'comments'
 
 FONT_CHOICES = (
    (' ', _('- Default -')),
@@ -381,6 +399,39 @@ class RelatedContent(models.Model):
         ordering = ['order', ]
 
 
+def prefetch_pictures(objects):
+    """
+    Sets the related pictures of a list of contents, which pictures()
+    returns, with one query for the related contents and one for the
+    pictures.
+    """
+    # models like Article override pictures with their own field
+    objects = [obj for obj in objects
+               if getattr(type(obj).pictures, 'im_func', None) is BaseContent.pictures.im_func
+               and getattr(obj, "_pictures", False) is False]
+    if not objects:
+        return
+    pic_model = models.get_model('medialibrary', 'picture')
+    pic_ctype = ContentType.objects.get_for_model(pic_model)
+
+    by_key = {}
+    object_ids = defaultdict(list)
+    for obj in objects:
+        obj._pictures = []
+        ct_id = ContentType.objects.get_for_model(obj).pk
+        by_key[(ct_id, obj.pk)] = obj
+        object_ids[ct_id].append(obj.pk)
+
+    related = reduce(operator.or_, [models.Q(self_type=ct_id, self_id__in=ids)
+                                    for ct_id, ids in object_ids.iteritems()])
+    rel_contents = list(RelatedContent.objects.filter(related, other_type=pic_ctype)
+                        .values_list('self_type', 'self_id', 'other_id'))
+    pictures = pic_model.objects.in_bulk(set(r[2] for r in rel_contents))
+    for self_type, self_id, other_id in rel_contents:
+        if other_id in pictures:
+            by_key[(self_type, self_id)]._pictures.append(pictures[other_id])
+
+
 class BaseContent(models.Model):
     """Parent class for every content model.
     """
@@ -456,14 +507,7 @@ class BaseContent(models.Model):
         return trans_links
 
     def pictures(self):
-        if getattr(self, "_pictures", False) is not False:
-            return self._pictures
-        self._pictures = None
-        if self.related_contents:
-            pic_model = models.get_model('medialibrary', 'picture')
-            ctype = ContentType.objects.get_for_model(pic_model)
-            rel_contents = self.related_contents.filter(other_type__pk=ctype.pk)
-            self._pictures = [ r.other_object for r in rel_contents ]
+        prefetch_pictures([self])
         return self._pictures
 
     def get_author_or_user(self):
@@ -549,6 +593,54 @@ class Image(models.Model, ThumbnailMixin):
         verbose_name_plural = _('images')
 
 
+class SearchIndexUpdate(models.Model):
+    """A pending change of the search index, applied by process_search_queue."""
+
+    ACTIONS = (('update', _('update')),
+               ('delete', _('delete')))
+
+    content_type = models.ForeignKey(ContentType, verbose_name=_('content type'))
+    object_id = models.PositiveIntegerField()
+    action = models.CharField(_('action'), max_length=6, choices=ACTIONS)
+    creation_date = models.DateTimeField(_('creation date'), default=datetime.now)
+
+    class Meta:
+        verbose_name = _('search index update')
+        verbose_name_plural = _('search index updates')
+
+
+class QueuedMail(models.Model):
+    """An outgoing message, sent by the send_queued_mail command."""
+
+    STATUS = (('queued', _('queued')),
+              ('failed', _('failed')))
+
+    subject = models.CharField(_('subject'), max_length=255)
+    recipients = models.TextField(_('recipients'))
+    # the pickled EmailMessage, base64 encoded
+    message = models.TextField(editable=False)
+    status = models.CharField(_('status'), max_length=6, choices=STATUS,
+                              default='queued', db_index=True)
+    attempts = models.PositiveIntegerField(_('attempts'), default=0)
+    next_attempt = models.DateTimeField(_('next attempt'), default=datetime.now,
+                                        db_index=True)
+    last_error = models.TextField(_('last error'), blank=True)
+    creation_date = models.DateTimeField(_('creation date'), default=datetime.now)
+
+    def __unicode__(self):
+        return self.subject
+
+    def get_message(self):
+        return pickle.loads(base64.b64decode(self.message))
+
+    def set_message(self, message):
+        self.message = base64.b64encode(pickle.dumps(message, pickle.HIGHEST_PROTOCOL))
+
+    class Meta:
+        verbose_name = _('queued mail')
+        verbose_name_plural = _('queued mails')
+
+
 def _delete_related_contents(sender, instance, **kwargs):
     # cascade delete does not delete the RelatedContent elements
     # where this object is the related content, so we do it here.
@@ -579,3 +671,168 @@ def _delete_from_layouts_and_menuitems(sender, instance, **kwargs):
 
 pre_delete.connect(_delete_related_contents)
 pre_delete.connect(_delete_from_layouts_and_menuitems)
+
+
+def _invalidate_region_cache(sender, instance, **kwargs):
+    # any change of the site structure or its contents may show up in
+    # a cached region view so they are all discarded
+    if kwargs.get('raw', False):
+        return
+    if sender in _REGION_CACHE_SENDERS or isinstance(instance, BaseContent):
+        bump_cache_version(REGION_CACHE)
+
+_REGION_CACHE_SENDERS = (RegionView, Layout, Menu, MenuItem, Categorization,
+                         Category, Collection, Author, Source, SiteSettings,
+                         DesignSettings)
+
+post_save.connect(_invalidate_region_cache,
+                  dispatch_uid="cyclope.models.region_cache.save")
+post_delete.connect(_invalidate_region_cache,
+                    dispatch_uid="cyclope.models.region_cache.delete")
+
+
+class LayoutRegistry(object):
+    """
+    Process local registry of Layouts by id.
+
+    Lets the session keep only the id of the layout. The registry is
+    discarded when any Layout changes, in this or any other process.
+    """
+    def __init__(self):
+        self._layouts = {}
+        self._version = None
+
+    def get(self, layout_id):
+        """Returns the Layout with the given id or None if it doesn't exist."""
+        version = get_cache_version(LAYOUTS_CACHE)
+        if version != self._version:
+            self._layouts = {}
+            self._version = version
+        layout = self._layouts.get(layout_id)
+        if layout is None:
+            try:
+                layout = Layout.objects.get(pk=layout_id)
+            except (Layout.DoesNotExist, ValueError, TypeError):
+                return None
+            self._layouts[layout_id] = layout
+        return layout
+
+layout_registry = LayoutRegistry()
+
+def _invalidate_layout_registry(sender, instance, **kwargs):
+    bump_cache_version(LAYOUTS_CACHE)
+
+post_save.connect(_invalidate_layout_registry, sender=Layout,
+                  dispatch_uid="cyclope.models.layout_registry.save")
+post_delete.connect(_invalidate_layout_registry, sender=Layout,
+                    dispatch_uid="cyclope.models.layout_registry.delete")
+
+
+def _prerender_markup(sender, instance, **kwargs):
+    # the rendered texts are cached by content so views find them ready
+    if kwargs.get('raw', False) or not isinstance(instance, BaseContent):
+        return
+    import cyclope.settings as cyc_settings
+    if cyc_settings.CYCLOPE_PRERENDER_MARKUP:
+        from cyclope.utils.markup import prerender
+        prerender(instance)
+
+post_save.connect(_prerender_markup, dispatch_uid="cyclope.models.prerender_markup")
+
+
+def sitemap_cache_name(model):
+    return 'sitemap_%s.%s' % (model._meta.app_label, model._meta.module_name)
+
+def _invalidate_sitemap(sender, instance, **kwargs):
+    # the cached sitemap pages of a content type are discarded when any
+    # content of that type changes
+    if isinstance(instance, BaseContent):
+        bump_cache_version(sitemap_cache_name(sender))
+
+post_save.connect(_invalidate_sitemap, dispatch_uid="cyclope.models.sitemap.save")
+post_delete.connect(_invalidate_sitemap, dispatch_uid="cyclope.models.sitemap.delete")
+
+
+def _invalidate_feeds(sender, instance, **kwargs):
+    if sender in _FEEDS_CACHE_SENDERS or isinstance(instance, BaseContent):
+        bump_cache_version(FEEDS_CACHE)
+
+_FEEDS_CACHE_SENDERS = (Categorization, Category, Author, SiteSettings)
+
+def _invalidate_feeds_content_types(sender, instance, **kwargs):
+    if kwargs['action'].startswith('post_'):
+        bump_cache_version(FEEDS_CACHE)
+
+post_save.connect(_invalidate_feeds, dispatch_uid="cyclope.models.feeds.save")
+post_delete.connect(_invalidate_feeds, dispatch_uid="cyclope.models.feeds.delete")
+m2m_changed.connect(_invalidate_feeds_content_types,
+                    sender=SiteSettings.rss_content_types.through,
+                    dispatch_uid="cyclope.models.feeds.content_types")
+
+
+def _invalidate_comments(sender, instance, **kwargs):
+    if isinstance(instance, Comment):
+        bump_cache_version(COMMENTS_CACHE)
+
+post_save.connect(_invalidate_comments, dispatch_uid="cyclope.models.comments.save")
+post_delete.connect(_invalidate_comments, dispatch_uid="cyclope.models.comments.delete")
+
+
+def menu_cache_name(menu_id):
+    return 'menu_%s' % menu_id
+
+def _invalidate_menu(sender, instance, **kwargs):
+    # fixtures are not skipped, they may reuse the ids of cached menus
+    if sender is Menu:
+        bump_cache_version(menu_cache_name(instance.pk))
+    elif sender is MenuItem and instance.menu_id is not None:
+        bump_cache_version(menu_cache_name(instance.menu_id))
+
+def _invalidate_previous_menu(sender, instance, **kwargs):
+    # an item moved to another menu leaves the previous one
+    if instance.pk is not None:
+        for menu_id in MenuItem.objects.filter(pk=instance.pk).exclude(
+                menu=instance.menu_id).values_list('menu_id', flat=True):
+            bump_cache_version(menu_cache_name(menu_id))
+
+post_save.connect(_invalidate_menu, dispatch_uid="cyclope.models.menu.save")
+post_delete.connect(_invalidate_menu, dispatch_uid="cyclope.models.menu.delete")
+pre_save.connect(_invalidate_previous_menu, sender=MenuItem,
+                 dispatch_uid="cyclope.models.menu.move")
+
+
+def _purge_page_cache(sender, instance, **kwargs):
+    # read from the django settings, cyclope.settings needs the SiteSettings
+    # that may not exist yet (eg. during syncdb)
+    if kwargs.get('raw', False) or \
+       not getattr(settings, 'CYCLOPE_PAGE_CACHE_TIMEOUT', 0):
+        return
+    from cyclope.page_cache import purge_instance
+    purge_instance(sender, instance)
+
+def _connect_page_cache(model):
+    uid = "%s.%s" % (model._meta.app_label, model._meta.object_name)
+    post_save.connect(_purge_page_cache, sender=model,
+                      dispatch_uid="cyclope.models.page_cache.save.%s" % uid)
+    post_delete.connect(_purge_page_cache, sender=model,
+                        dispatch_uid="cyclope.models.page_cache.delete.%s" % uid)
+
+def _connect_page_cache_content(sender, **kwargs):
+    # contents and comments are defined by other apps
+    if issubclass(sender, (BaseContent, Comment)) and not sender._meta.abstract:
+        _connect_page_cache(sender)
+
+def _model_subclasses(model):
+    for subclass in model.__subclasses__():
+        yield subclass
+        for sub in _model_subclasses(subclass):
+            yield sub
+
+# only the models that can change the tags of a page
+for model in (Categorization, Category, Collection, RegionView, Layout, MenuItem,
+              Menu, Author, SiteSettings, DesignSettings, Site, Comment):
+    _connect_page_cache(model)
+for model in _model_subclasses(Comment):
+    _connect_page_cache_content(model)
+class_prepared.connect(_connect_page_cache_content,
+                       dispatch_uid="cyclope.models.page_cache.content")
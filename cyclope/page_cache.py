@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010-2013 Código Sur Sociedad Civil.
+# All rights reserved.
+#
+# This file is part of Cyclope.
+#
+# Cyclope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Cyclope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Page cache tags
+---------------
+
+Pages cached by PageCacheMiddleware are tagged with the objects and models
+that were rendered in them: frontend views tag their content object (or
+their model for list views), regions tag their layout and region views and
+the middleware tags the menu item of the page.
+
+Each tag has a version token in the cache. A cached page stores the
+versions of its tags and is discarded when any of them changes, so purging
+a tag only invalidates the pages that carry it.
+
+The CYCLOPE_PAGE_CACHE_TIMEOUT setting holds the seconds the pages are
+cached, 0 (the default) disables the cache. It's read from the Django
+settings because the tags are purged from signal handlers, that may run
+before the site settings exist (eg. during syncdb).
+"""
+
+import uuid
+import operator
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from cyclope.utils import CACHE_VERSION_TIMEOUT
+
+# carried by every page, purged when the site or design settings change
+SITE_TAG = 'site'
+
+
+def get_timeout():
+    return getattr(settings, 'CYCLOPE_PAGE_CACHE_TIMEOUT', 0)
+
+def model_tag(model):
+    return 'm:%s.%s' % (model._meta.app_label, model._meta.module_name)
+
+def object_tag(obj, pk=None):
+    """Returns the tag of obj, or of the object of model obj with the given pk."""
+    return '%s.%s' % (model_tag(obj).replace('m:', 'o:', 1),
+                      obj.pk if pk is None else pk)
+
+def add_page_tags(request, *tags):
+    """Records tags of the page being rendered for request."""
+    if not hasattr(request, 'page_cache_tags'):
+        request.page_cache_tags = set()
+    request.page_cache_tags.update(tags)
+
+def _tag_key(tag):
+    return 'cyclope_page_tag_%s' % tag
+
+def get_tag_versions(tags):
+    """Returns a dict with the current version of each tag."""
+    keys = dict((_tag_key(tag), tag) for tag in tags)
+    versions = cache.get_many(keys.keys())
+    missing = dict((key, uuid.uuid4().hex) for key in keys if key not in versions)
+    if missing:
+        cache.set_many(missing, CACHE_VERSION_TIMEOUT)
+        versions.update(missing)
+    return dict((keys[key], version) for key, version in versions.iteritems())
+
+def tags_are_current(tag_versions):
+    """Tells if none of the tags changed since tag_versions were taken."""
+    current = cache.get_many([_tag_key(tag) for tag in tag_versions])
+    return all(current.get(_tag_key(tag)) == version
+               for tag, version in tag_versions.iteritems())
+
+def purge_tags(*tags):
+    """Discards the cached pages that carry any of the tags."""
+    cache.set_many(dict((_tag_key(tag), uuid.uuid4().hex) for tag in tags),
+                   CACHE_VERSION_TIMEOUT)
+
+def tags_for_instance(sender, instance):
+    """Returns the tags of the pages that may show instance."""
+    from django.contrib.comments.models import Comment
+    from django.contrib.contenttypes.models import ContentType
+    from django.contrib.sites.models import Site
+    from cyclope.models import (MenuItem, RegionView, Layout, Menu,
+                                SiteSettings, DesignSettings)
+    from cyclope.core.collections.models import (Categorization, Category,
+                                                 Collection, Collectible)
+
+    def content_tag(ct_id, object_id):
+        model = ContentType.objects.get_for_id(ct_id).model_class()
+        return object_tag(model, object_id) if model else None
+
+    tags = [object_tag(instance), model_tag(sender)]
+    if sender in (SiteSettings, DesignSettings, Site):
+        tags.append(SITE_TAG)
+    elif isinstance(instance, Categorization):
+        tags.extend(category_tags([instance.category_id]))
+        tags.append(content_tag(instance.content_type_id, instance.object_id))
+    elif isinstance(instance, RegionView):
+        tags.append(object_tag(Layout, instance.layout_id))
+    elif isinstance(instance, MenuItem):
+        tags.append(object_tag(Menu, instance.menu_id))
+    elif isinstance(instance, Category):
+        tags.append(object_tag(Collection, instance.collection_id))
+        tags.extend(category_tags([instance.pk]))
+    elif isinstance(instance, Comment):
+        tags.append(content_tag(instance.content_type_id, instance.object_pk))
+    if isinstance(instance, Collectible):
+        # category listings show the name and teaser of their contents
+        ct = ContentType.objects.get_for_model(instance)
+        category_ids = Categorization.objects.filter(
+            content_type=ct, object_id=instance.pk).values_list('category_id', flat=True)
+        tags.extend(category_tags(category_ids))
+    return filter(None, tags)
+
+def category_tags(category_ids):
+    """
+    Returns the tags of the categories and of their ancestors, whose
+    listings show the contents of their children with traverse_children.
+    """
+    from cyclope.core.collections.models import Category
+    nodes = Category.objects.filter(pk__in=list(category_ids)).values_list(
+                                        'pk', 'tree_id', 'lft', 'rght')
+    if not nodes:
+        return []
+    ancestors = reduce(operator.or_, [Q(tree_id=tree_id, lft__lt=lft, rght__gt=rght)
+                                      for pk, tree_id, lft, rght in nodes])
+    pks = set(pk for pk, tree_id, lft, rght in nodes)
+    pks.update(Category.objects.filter(ancestors).values_list('pk', flat=True))
+    return [object_tag(Category, pk) for pk in pks]
+
+def purge_instance(sender, instance):
+    if get_timeout():
+        purge_tags(*tags_for_instance(sender, instance))
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010-2013 Código Sur Sociedad Civil.
+# All rights reserved.
+#
+# This file is part of Cyclope.
+#
+# Cyclope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Cyclope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Queued search indexing
+----------------------
+
+QueuedSearchIndex records the saves and deletes of its model as
+SearchIndexUpdate rows instead of writing the index in the request.
+process_search_queue applies them in batches, with one index commit per
+batch when using Whoosh.
+"""
+
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import signals, Min
+from django.contrib.contenttypes.models import ContentType
+from django.utils.encoding import force_unicode
+from haystack import site
+from haystack.indexes import SearchIndex
+
+from cyclope.models import SearchIndexUpdate
+from cyclope.utils import total_seconds
+
+
+class QueuedSearchIndex(SearchIndex):
+    """A SearchIndex that is updated by process_search_queue."""
+
+    def _setup_save(self, model):
+        signals.post_save.connect(self.enqueue_update, sender=model)
+
+    def _setup_delete(self, model):
+        signals.post_delete.connect(self.enqueue_delete, sender=model)
+
+    def _teardown_save(self, model):
+        signals.post_save.disconnect(self.enqueue_update, sender=model)
+
+    def _teardown_delete(self, model):
+        signals.post_delete.disconnect(self.enqueue_delete, sender=model)
+
+    def _enqueue(self, instance, action):
+        SearchIndexUpdate.objects.create(
+            content_type=ContentType.objects.get_for_model(instance),
+            object_id=instance.pk, action=action)
+
+    def enqueue_update(self, instance, **kwargs):
+        if self.should_update(instance, **kwargs):
+            self._enqueue(instance, 'update')
+
+    def enqueue_delete(self, instance, **kwargs):
+        self._enqueue(instance, 'delete')
+
+
+def _identifier(model, object_id):
+    return u'%s.%s.%s' % (model._meta.app_label, model._meta.module_name, object_id)
+
+def uses_whoosh():
+    return getattr(settings, 'HAYSTACK_SEARCH_ENGINE', None) == 'whoosh'
+
+def whoosh_backend():
+    """
+    Returns the haystack Whoosh backend, ready to write. All the indexes
+    share the same Whoosh index, so one writer is enough for all of them.
+    """
+    backend = site.get_indexes().values()[0].backend
+    if not backend.setup_complete:
+        backend.setup()
+    backend.index = backend.index.refresh()
+    return backend
+
+def whoosh_value(value):
+    """Converts a prepared field value to what Whoosh stores, like haystack."""
+    if hasattr(value, 'strftime'):
+        if not hasattr(value, 'hour'):
+            value = datetime(value.year, value.month, value.day)
+    elif isinstance(value, bool):
+        value = value and 'true' or 'false'
+    elif isinstance(value, (list, tuple)):
+        value = u','.join([force_unicode(v) for v in value])
+    elif not isinstance(value, (int, long, float)):
+        value = force_unicode(value)
+    return value
+
+def prepare_document(index, obj):
+    """Returns the Whoosh document of obj."""
+    doc = index.full_prepare(obj)
+    for key in doc:
+        doc[key] = whoosh_value(doc[key])
+    return doc
+
+def _apply(updates, deletes):
+    """
+    Writes the updated objects, a list of (index, obj) tuples, and removes the
+    deleted identifiers from the search index.
+    """
+    if not (updates or deletes):
+        return
+    if not uses_whoosh():
+        for index, obj in updates:
+            index.backend.update(index, [obj])
+        for identifier in deletes:
+            site.get_indexes().values()[0].backend.remove(identifier)
+        return
+
+    from haystack.constants import ID
+    from whoosh.writing import AsyncWriter
+    backend = whoosh_backend()
+    writer = AsyncWriter(backend.index)
+    for identifier in deletes:
+        writer.delete_by_term(ID, identifier)
+    for index, obj in updates:
+        writer.update_document(**prepare_document(index, obj))
+    writer.commit()
+
+def process_search_queue(batch_size=500):
+    """
+    Applies the oldest batch_size pending index updates. Repeated changes of
+    an object are coalesced, only its last action is applied.
+
+    Returns a dict with the number of processed rows, the number of updated
+    and deleted objects and the lag, in seconds, of the oldest pending row.
+    """
+    rows = list(SearchIndexUpdate.objects.order_by('id')[:batch_size]
+                .values_list('id', 'content_type', 'object_id', 'action'))
+    stats = {'processed': len(rows), 'updated': 0, 'deleted': 0, 'lag': 0}
+    if not rows:
+        return stats
+    oldest = SearchIndexUpdate.objects.aggregate(date=Min('creation_date'))['date']
+    stats['lag'] = total_seconds(datetime.now() - oldest)
+
+    # rows are sorted by id so the last action of each object wins
+    actions = {}
+    for row_id, ct_id, object_id, action in rows:
+        actions[(ct_id, object_id)] = action
+
+    to_update = {}
+    deletes = []
+    for (ct_id, object_id), action in actions.iteritems():
+        model = ContentType.objects.get_for_id(ct_id).model_class()
+        if model is None or model not in site.get_indexed_models():
+            continue
+        if action == 'update':
+            to_update.setdefault(model, []).append(object_id)
+        else:
+            deletes.append(_identifier(model, object_id))
+    updates = []
+    for model, object_ids in to_update.iteritems():
+        index = site.get_index(model)
+        objects = index.index_queryset().in_bulk(object_ids)
+        for object_id in object_ids:
+            if object_id in objects:
+                updates.append((index, objects[object_id]))
+            else:
+                # deleted after being queued, or excluded by index_queryset
+                deletes.append(_identifier(model, object_id))
+
+    _apply(updates, deletes)
+    # only the rows read, a transaction committed meanwhile may have queued
+    # rows with lower ids
+    SearchIndexUpdate.objects.filter(id__in=[row[0] for row in rows]).delete()
+    stats['updated'], stats['deleted'] = len(updates), len(deletes)
+    return stats
@@ -84,10 +84,67 @@ CYCLOPE_PAGINATION = getattr(settings, 'CYCLOPE_PAGINATION',
                                'DETAIL' : 9999,
                                })
 CYCLOPE_RSS_LIMIT = 50
+# seconds the site feeds are cached, they are invalidated when contents change
+CYCLOPE_RSS_CACHE_TIMEOUT = getattr(settings, 'CYCLOPE_RSS_CACHE_TIMEOUT', 60*60)
 
 # Feed
 
 CYCLOPE_FEED_CACHE_TIME = getattr(settings, 'CYCLOPE_FEED_CACHE_TIME', 600)
+# seconds to wait for a remote feed and number of feeds fetched at once
+CYCLOPE_FEED_FETCH_TIMEOUT = getattr(settings, 'CYCLOPE_FEED_FETCH_TIMEOUT', 10)
+CYCLOPE_FEED_FETCH_THREADS = getattr(settings, 'CYCLOPE_FEED_FETCH_THREADS', 4)
+
+# Markup
+
+# seconds rendered texts are kept in the shared cache
+CYCLOPE_MARKUP_CACHE_TIMEOUT = getattr(settings, 'CYCLOPE_MARKUP_CACHE_TIMEOUT', 60*60*24*7)
+# render the texts of the contents when they are saved
+CYCLOPE_PRERENDER_MARKUP = getattr(settings, 'CYCLOPE_PRERENDER_MARKUP', False)
+# worker processes that render markup (0 renders in the web process, forking
+# them from threaded web servers isn't safe) and number of renders after which
+# each worker is replaced (needs python 2.7)
+CYCLOPE_MARKUP_PROCESSES = getattr(settings, 'CYCLOPE_MARKUP_PROCESSES', 0)
+CYCLOPE_MARKUP_MAX_RENDERS = getattr(settings, 'CYCLOPE_MARKUP_MAX_RENDERS', 500)
+
+# Mail queue
+
+# failed deliveries are retried after CYCLOPE_MAIL_RETRY_DELAY seconds, doubling
+# the delay each time, until CYCLOPE_MAIL_MAX_ATTEMPTS
+CYCLOPE_MAIL_MAX_ATTEMPTS = getattr(settings, 'CYCLOPE_MAIL_MAX_ATTEMPTS', 5)
+CYCLOPE_MAIL_RETRY_DELAY = getattr(settings, 'CYCLOPE_MAIL_RETRY_DELAY', 60)
+
+# Newsletter
+
+# recipients mailed at once by send_newsletters and messages sent per second
+# (0 doesn't limit the rate)
+CYCLOPE_NEWSLETTER_BATCH_SIZE = getattr(settings, 'CYCLOPE_NEWSLETTER_BATCH_SIZE', 100)
+CYCLOPE_NEWSLETTER_RATE = getattr(settings, 'CYCLOPE_NEWSLETTER_RATE', 10)
+# seconds the inlined html of a newsletter is cached
+CYCLOPE_NEWSLETTER_CACHE_TIMEOUT = getattr(settings, 'CYCLOPE_NEWSLETTER_CACHE_TIMEOUT', 60*60*24)
+
+# Sitemaps
+
+# urls in each page of a sitemap section and seconds the pages of content types
+# are cached (they are invalidated when a content of its type changes)
+CYCLOPE_SITEMAP_LIMIT = getattr(settings, 'CYCLOPE_SITEMAP_LIMIT', 50000)
+CYCLOPE_SITEMAP_CACHE_TIMEOUT = getattr(settings, 'CYCLOPE_SITEMAP_CACHE_TIMEOUT', 60*60*24)
+
+# Region views
+
+# seconds the region views that opt in cache their output
+CYCLOPE_REGION_CACHE_TIMEOUT = getattr(settings, 'CYCLOPE_REGION_CACHE_TIMEOUT', 300)
+
+# Permissions
+
+# seconds the category and collection permissions of a user are cached (they
+# are invalidated when any permission changes)
+CYCLOPE_PERMS_CACHE_TIMEOUT = getattr(settings, 'CYCLOPE_PERMS_CACHE_TIMEOUT', 60*60*24)
+
+# Menus
+
+# seconds the items of a menu are cached by the menu views (they are
+# invalidated when the menu or any of its items change)
+CYCLOPE_MENU_CACHE_TIMEOUT = getattr(settings, 'CYCLOPE_MENU_CACHE_TIMEOUT', 60*60*24)
 
 CYCLOPE_PROJECT_PATH = getattr(settings, 'CYCLOPE_PROJECT_PATH', None)
 
@@ -19,14 +19,43 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+"""
+Sitemaps of the site: one section for menus, categories and collections and
+one for each content type. The index lists every page of every section,
+pages hold up to CYCLOPE_SITEMAP_LIMIT urls and are streamed; the pages of
+content types are cached until a content of that type changes.
+"""
+
 from django.contrib.sitemaps import Sitemap
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.http import HttpResponse, Http404
+from django.utils.datastructures import SortedDict
+from django.utils.html import escape
 
-from cyclope.models import MenuItem
+from cyclope.models import MenuItem, sitemap_cache_name
 from cyclope.core.collections.models import Collection, Category
+from cyclope.core import frontend
+from cyclope.utils import get_cache_version, make_cache_key
 import cyclope.settings as cyc_settings
 
 
-class CategorySitemap(Sitemap):
+class CyclopeSitemap(Sitemap):
+
+    @property
+    def limit(self):
+        return cyc_settings.CYCLOPE_SITEMAP_LIMIT
+
+    def page_items(self, page):
+        return self.paginator.page(page).object_list
+
+    def cache_key(self, page):
+        """Returns the key where the page is cached, or None to not cache it."""
+        return None
+
+
+class CategorySitemap(CyclopeSitemap):
     changefreq = "weekly"
     priority = 0.2
 
@@ -34,7 +63,7 @@ class CategorySitemap(Sitemap):
         return Category.objects.filter(collection__visible = True)
 
 
-class CollectionSitemap(Sitemap):
+class CollectionSitemap(CyclopeSitemap):
     changefreq = "weekly"
     priority = 0.3
 
@@ -42,7 +71,7 @@ class CollectionSitemap(Sitemap):
         return Collection.objects.filter(visible=True)
 
 
-class MenuSitemap(Sitemap):
+class MenuSitemap(CyclopeSitemap):
     changefreq = "monthly"
     priority = 0.7
 
@@ -54,3 +83,110 @@ class MenuSitemap(Sitemap):
 
     def location(self, obj):
         return obj.custom_url or cyc_settings.CYCLOPE_PREFIX + "/" + obj.url
+
+
+class BaseContentSitemap(CyclopeSitemap):
+    """Sitemap of the published contents of a BaseContent model."""
+    changefreq = "weekly"
+    priority = 0.5
+
+    def __init__(self, model):
+        self.model = model
+
+    def items(self):
+        return self.model.objects.filter(published=True).order_by('pk')
+
+    def lastmod(self, obj):
+        return obj.modification_date
+
+    def page_items(self, page):
+        # seeks the first pk of the page instead of using a large offset
+        items = self.items()
+        offset = (page - 1) * self.limit
+        first = list(items.values_list('pk', flat=True)[offset:offset + 1])
+        if not first:
+            return []
+        return items.filter(pk__gte=first[0])[:self.limit].iterator()
+
+    def cache_key(self, page):
+        version = get_cache_version(sitemap_cache_name(self.model))
+        return make_cache_key('sitemap', self.model._meta.app_label,
+                              self.model._meta.module_name, page, version)
+
+
+def get_sitemaps():
+    sitemaps = SortedDict([("menus", MenuSitemap()),
+                           ("categories", CategorySitemap()),
+                           ("collections", CollectionSitemap())])
+    for model in sorted(frontend.site.base_content_types,
+                        key=lambda model: model._meta.module_name):
+        sitemaps[model._meta.module_name] = BaseContentSitemap(model)
+    return sitemaps
+
+
+def _get(sitemap, name, obj):
+    attr = getattr(sitemap, name, None)
+    if callable(attr):
+        return attr(obj)
+    return attr
+
+def _url_xml(sitemap, obj, base_url):
+    loc = _get(sitemap, 'location', obj)
+    parts = [u'<url><loc>%s%s</loc>' % (base_url, escape(loc))]
+    lastmod = _get(sitemap, 'lastmod', obj)
+    if lastmod:
+        parts.append(u'<lastmod>%s</lastmod>' % lastmod.strftime('%Y-%m-%d'))
+    changefreq = _get(sitemap, 'changefreq', obj)
+    if changefreq:
+        parts.append(u'<changefreq>%s</changefreq>' % changefreq)
+    priority = _get(sitemap, 'priority', obj)
+    if priority is not None:
+        parts.append(u'<priority>%s</priority>' % priority)
+    parts.append(u'</url>\n')
+    return u''.join(parts).encode('utf-8')
+
+def _stream_page(sitemap, page, key):
+    base_url = 'http://%s' % Site.objects.get_current().domain
+    chunks = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+    yield chunks[0]
+    for obj in sitemap.page_items(page):
+        chunk = _url_xml(sitemap, obj, base_url)
+        if key:
+            chunks.append(chunk)
+        yield chunk
+    chunks.append('</urlset>\n')
+    yield chunks[-1]
+    if key:
+        cache.set(key, ''.join(chunks), cyc_settings.CYCLOPE_SITEMAP_CACHE_TIMEOUT)
+
+
+def index(request):
+    """Lists the pages of every section."""
+    base_url = 'http://%s' % Site.objects.get_current().domain
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+             '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+    for name, sitemap in get_sitemaps().iteritems():
+        url = base_url + reverse('sitemap_section', kwargs={'section': name})
+        for page in range(1, sitemap.paginator.num_pages + 1):
+            loc = url if page == 1 else '%s?p=%d' % (url, page)
+            lines.append('<sitemap><loc>%s</loc></sitemap>\n' % escape(loc))
+    lines.append('</sitemapindex>\n')
+    return HttpResponse(''.join(lines), content_type='application/xml')
+
+def section(request, section):
+    """Streams a page of a section, or serves it from the cache."""
+    sitemap = get_sitemaps().get(section)
+    if sitemap is None:
+        raise Http404
+    try:
+        page = int(request.GET.get('p', 1))
+    except ValueError:
+        raise Http404
+    key = sitemap.cache_key(page)
+    xml = cache.get(key) if key else None
+    if xml is None:
+        if page < 1 or page > max(sitemap.paginator.num_pages, 1):
+            raise Http404
+        xml = _stream_page(sitemap, page, key)
+    return HttpResponse(xml, content_type='application/xml')
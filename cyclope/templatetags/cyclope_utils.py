@@ -28,14 +28,9 @@ General utility helper tags.
 
 from django import template
 from django.utils.safestring import mark_safe
-from django.contrib.markup.templatetags import markup
 
-import cyclope.settings as cyc_settings
-from cyclope.utils import nohang, get_object_name, get_app_label
-from cyclope.utils.lru_cache import LRULimitedSizeDict
-
-MARKUP_RENDERER_WAIT = 5
-MARKUP_CACHE_SIZE = 250
+from cyclope.utils import get_object_name, get_app_label
+from cyclope.utils.markup import render_markup
 
 register = template.Library()
 
@@ -157,29 +152,9 @@ def admin_list_filter_without_all(cl, spec):
 admin_list_filter_without_all = register.inclusion_tag('admin/filter.html')(admin_list_filter_without_all)
 
 
-lru_cache = LRULimitedSizeDict(size_limit=MARKUP_CACHE_SIZE)
-
 @register.filter
 def smart_style(value):
-    value_hash = hash(value)
-    result = lru_cache.get(value_hash, None)
-    if result is not None:
-        return result
-
-    style = cyc_settings.CYCLOPE_TEXT_STYLE
-    styles = {"wysiwyg": mark_safe,
-              "markdown": markup.markdown,
-              "textile": markup.textile,
-              "raw": mark_safe}
-    renderer = styles.get(style, None)
-    if renderer is None:
-        raise ValueError("Bad TEXT_STYLE option: %s" % style)
-    else:
-        result, success = nohang.run(renderer, args=(value,), wait=MARKUP_RENDERER_WAIT)
-        if not success:
-            result = value
-        lru_cache[value_hash] = result
-        return result
+    return render_markup(value)
 
 smart_style.is_safe = True
 
@@ -30,10 +30,13 @@ import json
 
 from django import template
 from django.contrib.contenttypes.models import ContentType
+from django.utils.translation import get_language
 
-from cyclope.utils import layout_for_request, get_or_set_cache
+from cyclope.utils import (layout_for_request, get_or_set_cache,
+                           get_cache_version, make_cache_key, get_page_context)
 from cyclope.core import frontend
-from cyclope.models import SiteSettings
+from cyclope.page_cache import add_page_tags, object_tag, model_tag
+from cyclope.models import SiteSettings, REGION_CACHE
 from cyclope.utils import layout_for_request, LazyJSONEncoder
 from cyclope.themes import get_theme
 
@@ -54,7 +57,8 @@ def region(context, region_name):
 
     """
 
-    theme = get_theme(SiteSettings.objects.get().theme)
+    page_context = get_page_context(context['request'])
+    theme = page_context.theme
 
     region_ids = ""
     if hasattr(theme, "region_layout_ids"):
@@ -67,15 +71,16 @@ def region(context, region_name):
         region_classes = theme.region_layout_classes.get(region_name, "")
         
     # if we have a layout in the context use that one, otherwise guess it from the request
-    layout = context.get('layout', layout_for_request(context['request']))
+    layout = context.get('layout') or page_context.layout
     region_vars = {'layout_name': layout.slug,
                    'region_name': region_name,
                    'region_layout_ids': region_ids,
                    'region_layout_classes': region_classes}
 
-    regionviews = layout.regionview_set.filter(
-        region=region_name).order_by('weight')
+    regionviews = page_context.get_region_views(layout, region_name)
     views = []
+    # cached region views are not called, so the region tags the page itself
+    add_page_tags(context['request'], object_tag(layout))
 
 
     for regionview in regionviews:
@@ -88,14 +93,12 @@ def region(context, region_name):
         if view.is_instance_view:
             if regionview.content_object is None:
                 raise template.TemplateSyntaxError
-            slug = regionview.content_object.slug
-            view_vars['output'] = view(context['request'], region_name=region_name,
-                                       content_object=regionview.content_object,
-                                       view_options=regionview.view_options)
-            view_vars['slug'] = slug
+            view_vars['slug'] = regionview.content_object.slug
+            add_page_tags(context['request'], object_tag(regionview.content_object))
         else:
-            view_vars['output'] = view(context['request'], region_name=region_name,
-                                       view_options=regionview.view_options)
+            add_page_tags(context['request'], model_tag(view.model))
+        view_vars['output'] = _region_view_output(context['request'], view,
+                                                  layout, region_name, regionview)
         view_vars['name'] = regionview.content_view
         view_vars['model'] = regionview.content_type.model
         views.append(view_vars)
@@ -104,14 +107,41 @@ def region(context, region_name):
 
     return region_vars
 
-@register.simple_tag
-def layout_regions_data():
+def _region_view_output(request, view, layout, region_name, regionview):
+    """
+    Renders a view inside a region. The output of views that set a cache
+    timeout is cached for anonymous users.
+    """
+    kwargs = {'region_name': region_name,
+              'view_options': regionview.view_options}
+    if view.is_instance_view:
+        kwargs['content_object'] = regionview.content_object
+
+    timeout = view.get_region_cache_timeout(regionview.view_options)
+    user = getattr(request, 'user', None)
+    if timeout is None or user is None or user.is_authenticated():
+        return view(request, **kwargs)
+
+    key = make_cache_key('cyclope_region', get_cache_version(REGION_CACHE),
+                         layout.pk, region_name, regionview.content_type_id,
+                         regionview.content_view, regionview.object_id,
+                         json.dumps(regionview.view_options, sort_keys=True),
+                         request.GET.get('page', ''), get_language())
+    return get_or_set_cache(view, (request,), kwargs, key, timeout)
+
+def _site_settings(context):
+    request = context.get('request')
+    if request is not None:
+        return get_page_context(request).site_settings
+    return SiteSettings.objects.get()
+
+@register.simple_tag(takes_context=True)
+def layout_regions_data(context):
     """
     Builds a json object to embed on the admin's change_form of Layout. This
     object contains all the available views and regions for all templates.
     """
-    theme_name = SiteSettings.objects.get().theme
-    theme_settings = get_theme(theme_name)
+    theme_settings = get_theme(_site_settings(context).theme)
     out_dict = {}
     layout_templates = {}
     for name, dic_ in theme_settings.layout_templates.iteritems():
@@ -140,8 +170,8 @@ def layout_regions_data():
     json_data = json.dumps(out_dict, cls=LazyJSONEncoder)
     return json_data
     
-@register.simple_tag
-def bootstrap_skin_link():
+@register.simple_tag(takes_context=True)
+def bootstrap_skin_link(context):
     """
     Returns CSS link to the configured Bootswatch skin
     https://github.com/thomaspark/bootswatch
@@ -149,7 +179,7 @@ def bootstrap_skin_link():
     from cyclope import settings
     url = settings.CYCLOPE_THEME_MEDIA_URL
     path = "css/"
-    skin = SiteSettings.objects.get().skin_setting
+    skin = _site_settings(context).skin_setting
     if skin != 'bootstrap':
         path += 'skins/'
     link = '<link href="{}{}{}.min.css" rel="stylesheet">'.format(url, path, skin)
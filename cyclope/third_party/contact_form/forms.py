@@ -240,7 +240,10 @@ class ContactBaseForm(forms.Form):
         Build and send the email message.
 
         """
-        send_mail(fail_silently=fail_silently, **self.get_message_dict())
+        from cyclope import mail_queue
+        send_mail(fail_silently=fail_silently,
+                  connection=mail_queue.get_connection(),
+                  **self.get_message_dict())
 
 
 class ContactForm(ContactBaseForm):
@@ -326,8 +329,10 @@ class AdminSettingsContactForm(ContactForm):
         Build and send the email message.
 
         """
+        from cyclope import mail_queue
         d = self.get_message_dict()
         email = EmailMessage(d['subject'], d['message'], d['from_email'],
                              d['recipient_list'],
-                             headers = {'Reply-To': self.reply_to()})
+                             headers = {'Reply-To': self.reply_to()},
+                             connection=mail_queue.get_connection())
         email.send(fail_silently)
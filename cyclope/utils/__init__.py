@@ -27,9 +27,16 @@ Helper methods and classes.
 """
 
 import os
+import uuid
+import heapq
+import hashlib
+from collections import defaultdict, namedtuple
+from itertools import islice
+
 from django.contrib.contenttypes.models import ContentType
 from django.core.paginator import InvalidPage, EmptyPage
-from django.db.models import Q
+from django.db.models import Q, Count
+from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Submit
@@ -48,43 +55,101 @@ def get_extension(filename):
     """
     return os.path.splitext(filename)[1].lower().replace(".", "")
 
+class PageContext(object):
+    """
+    Holds the objects resolved for a request that are shared by the layout and
+    region helpers, so each one is fetched only once per request.
+
+    It's set as request.page_context by the LayoutMiddleware.
+    """
+    def __init__(self, request):
+        self.request = request
+        self._region_views = {}
+
+    @cached_property
+    def menu_item(self):
+        """The MenuItem matching the request URL or None."""
+        # Avoids a circular import
+        from cyclope.models import MenuItem
+        req_url = self.request.path
+        url = req_url[len(cyclope.settings.CYCLOPE_PREFIX)+1:]
+        menu_items = MenuItem.objects.select_related('layout')
+        if url == '':
+            try:
+                # when no home menuitem has yet been set this will fail
+                menu_item = menu_items.get(site_home=True)
+            except:
+                menu_item = None
+        else:
+            try:
+                # match menuitems with internal and external (custom) urls
+                menu_item = menu_items.get(Q(url=url)|Q(url=req_url))
+            except:
+                menu_item = None
+        return menu_item
+
+    @cached_property
+    def layout(self):
+        """
+        The layout of the MenuItem matching the request URL or the default
+        site layout if no matching MenuItem is found.
+        """
+        from cyclope.models import layout_registry
+        if self.menu_item:
+            return self.menu_item.get_layout()
+        layout = None
+        layout_id = self.request.session.get('layout')
+        if layout_id is not None:
+            # sessions created by older versions hold a Layout instance
+            layout = layout_registry.get(getattr(layout_id, 'pk', layout_id))
+        return layout or cyclope.settings.CYCLOPE_DEFAULT_LAYOUT
+
+    @cached_property
+    def template(self):
+        return 'cyclope/themes/%s/%s' % (cyclope.settings.CYCLOPE_CURRENT_THEME,
+                                         self.layout.template)
+
+    @cached_property
+    def site_settings(self):
+        from cyclope.models import SiteSettings
+        return SiteSettings.objects.get()
+
+    @cached_property
+    def theme(self):
+        from cyclope.themes import get_theme
+        return get_theme(self.site_settings.theme)
+
+    def get_region_views(self, layout, region_name):
+        """
+        Returns the RegionViews of a region of the layout ordered by weight.
+        All the RegionViews of the layout are fetched the first time.
+        """
+        from cyclope.models import RegionView
+        if layout.pk not in self._region_views:
+            region_views = defaultdict(list)
+            for region_view in RegionView.objects.filter(layout=layout).order_by(
+                    'weight').select_related('content_type').prefetch_related('content_object'):
+                region_views[region_view.region].append(region_view)
+            self._region_views[layout.pk] = region_views
+        return self._region_views[layout.pk].get(region_name, [])
+
+
+def get_page_context(request):
+    """Returns the PageContext of the request, creating it if needed."""
+    page_context = getattr(request, 'page_context', None)
+    if page_context is None:
+        page_context = request.page_context = PageContext(request)
+    return page_context
+
 def menu_item_for_request(request):
-    # Avoids a circular import
-    from cyclope.models import MenuItem
-    if getattr(request, "_menu_item", False) is not False:
-        return request._menu_item
-    req_url = request.path
-    url = req_url[len(cyclope.settings.CYCLOPE_PREFIX)+1:]
-    if url == '':
-        try:
-            # when no home menuitem has yet been set this will fail
-            menu_item = MenuItem.objects.select_related().get(site_home=True)
-        except:
-            menu_item = None
-    else:
-        try:
-            # match menuitems with internal and external (custom) urls
-            menu_item = MenuItem.objects.select_related().get(Q(url=url)|Q(url=req_url))
-        except:
-            menu_item = None
-    request._menu_item = menu_item
-    return menu_item
+    return get_page_context(request).menu_item
 
 def layout_for_request(request):
     """
     Returns the layout corresponding to the MenuItem matching the request URL
     or the default site layout if no matching MenuItem is found.
     """
-    menu_item = menu_item_for_request(request)
-    if menu_item:
-        layout = menu_item.get_layout()
-    else:
-        if request.session.has_key('layout'):
-            layout = request.session['layout']
-        else:
-            layout = cyclope.settings.CYCLOPE_DEFAULT_LAYOUT
-
-    return layout
+    return get_page_context(request).layout
 
 
 def template_for_request(request):
@@ -93,12 +158,7 @@ def template_for_request(request):
     matching the request or the default site template
     if no matching MenuItem is found.
     """
-    layout = layout_for_request(request)
-    template = 'cyclope/themes/%s/%s' % (
-                cyclope.settings.CYCLOPE_CURRENT_THEME,
-                layout.template
-                )
-    return template
+    return get_page_context(request).template
 
 
 from django.utils.functional import Promise
@@ -155,7 +215,7 @@ class NamePaginator(object):
                     obj_str = unicode(getattr(obj, on))
             else: obj_str = unicode(obj)
 
-            letter = remove_accents(obj_str[0]).upper()
+            letter = remove_accents(obj_str[:1]).upper()
 
             if letter not in chunks: chunks[letter] = []
 
@@ -262,6 +322,161 @@ def get_page(paginator, request):
 
     return page
 
+def select_related_fields(queryset, related=('author', 'source')):
+    """Follows the given foreign keys in the queryset, if its model has them."""
+    field_names = [field.name for field in queryset.model._meta.fields
+                   if field.rel and field.name in related]
+    if field_names:
+        queryset = queryset.select_related(*field_names)
+    return queryset
+
+def prefetch_content_objects(categorizations, related=('author', 'source'),
+                             pictures=True):
+    """
+    Fetches the content objects of a list of Categorizations (or any objects
+    with a content_object generic foreign key) with one query per content
+    type, following the given foreign keys when the model has them.
+    If pictures is True the pictures of the contents are also fetched.
+
+    Returns the list of categorizations with their content_object set.
+    """
+    categorizations = list(categorizations)
+    object_ids = defaultdict(set)
+    for categorization in categorizations:
+        object_ids[categorization.content_type_id].add(categorization.object_id)
+
+    objects = {}
+    for ct_id, ids in object_ids.iteritems():
+        model = ContentType.objects.get_for_id(ct_id).model_class()
+        if model is None:
+            continue
+        queryset = select_related_fields(model._default_manager.filter(pk__in=ids),
+                                         related)
+        for obj in queryset:
+            objects[(ct_id, obj.pk)] = obj
+
+    if pictures:
+        from cyclope.models import BaseContent, prefetch_pictures
+        prefetch_pictures([obj for obj in objects.itervalues()
+                           if isinstance(obj, BaseContent)])
+
+    for categorization in categorizations:
+        cache_attr = type(categorization).content_object.cache_attr
+        setattr(categorization, cache_attr, objects.get(
+            (categorization.content_type_id, categorization.object_id)))
+    return categorizations
+
+class _Descending(object):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+def merge_sorted(iterables, key, reverse=False):
+    """
+    Lazily merges iterables that are already sorted by key, like querysets
+    with the same order_by, consuming only the items it yields (and the next
+    one of each iterable).
+    """
+    if reverse:
+        sort_key = lambda item: _Descending(key(item))
+    else:
+        sort_key = key
+    heap = []
+    for index, iterable in enumerate(iterables):
+        iterator = iter(iterable)
+        for item in iterator:
+            heap.append((sort_key(item), index, item, iterator))
+            break
+    heapq.heapify(heap)
+    while heap:
+        value, index, item, iterator = heap[0]
+        yield item
+        for item in iterator:
+            heapq.heapreplace(heap, (sort_key(item), index, item, iterator))
+            break
+        else:
+            heapq.heappop(heap)
+
+# an item of MergedQuerySets: its sort value, queryset index and primary key
+MergedEntry = namedtuple('MergedEntry', 'value index pk')
+
+def _entries(values, index):
+    for value, pk in values:
+        yield MergedEntry(value, index, pk)
+
+class MergedQuerySets(object):
+    """
+    The objects of several querysets sorted by one of their fields, as a
+    sequence that a Paginator can count and slice.
+
+    Slicing reads from each queryset only the sort values and primary keys up
+    to the end of the slice, ordered and limited by the database, merges them
+    lazily and then loads the objects of the slice alone.
+    """
+    def __init__(self, querysets, field, reverse=False, limit=None):
+        order = '-' if reverse else ''
+        self.querysets = [qs.order_by(order + field, order + 'pk')
+                          for qs in querysets]
+        self.field = field
+        self.reverse = reverse
+        self.limit = limit
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = sum(qs.count() for qs in self.querysets)
+            if self.limit is not None:
+                self._count = min(self._count, self.limit)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def entries(self, stop=None):
+        """Lazily yields the MergedEntry of the first stop objects."""
+        if self.limit is not None:
+            stop = self.limit if stop is None else min(stop, self.limit)
+        iterables = []
+        for index, qs in enumerate(self.querysets):
+            values = qs.values_list(self.field, 'pk')
+            if stop is not None:
+                values = values[:stop]
+            iterables.append(_entries(values, index))
+        merged = merge_sorted(iterables, key=lambda entry: entry.value,
+                              reverse=self.reverse)
+        return islice(merged, stop)
+
+    def load(self, entries):
+        """Returns the objects of entries, in the same order."""
+        pks = defaultdict(list)
+        for entry in entries:
+            pks[entry.index].append(entry.pk)
+        objects = {}
+        for index, index_pks in pks.iteritems():
+            for obj in self.querysets[index].filter(pk__in=index_pks):
+                objects[(index, obj.pk)] = obj
+        return [objects[(entry.index, entry.pk)] for entry in entries
+                if (entry.index, entry.pk) in objects]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop = key.start or 0, key.stop
+            return self.load(list(islice(self.entries(stop), start, stop)))
+        objects = self[key:key + 1]
+        if not objects:
+            raise IndexError(key)
+        return objects[0]
+
+    def __iter__(self):
+        return iter(self[:])
+
 def _invalidate_cache(sender, **kwargs):
     sender._instance = None
 
@@ -288,6 +503,42 @@ def get_or_set_cache(func, args, kwargs, key, timeout=None):
         cache.set(key, out, timeout)
     return out
 
+# memcached treats timeouts longer than 30 days as absolute timestamps
+CACHE_VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+def get_cache_version(name):
+    """
+    Returns the current version token of a group of cached values.
+
+    Cached values that belong to a group include this token in their keys so
+    bumping it with bump_cache_version invalidates the whole group at once, in
+    every process sharing the cache.
+    """
+    from django.core.cache import cache
+    key = 'cyclope_version_%s' % name
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, CACHE_VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+def bump_cache_version(name):
+    from django.core.cache import cache
+    cache.set('cyclope_version_%s' % name, uuid.uuid4().hex, CACHE_VERSION_TIMEOUT)
+
+def make_cache_key(prefix, *parts):
+    """
+    Builds a cache key safe for every cache backend (memcached doesn't accept
+    spaces nor keys longer than 250 characters) from arbitrary parts.
+    """
+    digest = hashlib.md5(repr(parts)).hexdigest()
+    return '%s_%s' % (prefix, digest)
+
+# timedelta.total_seconds is new in python 2.7 http://docs.python.org/library/datetime.html
+# so we define an equivalent here for compatibility's sake
+def total_seconds(td):
+    return (td.microseconds + (td.seconds + td.days * 24 * 3600) * 10**6) / float(10**6)
+
 def generate_fb_version(image_path, version_suffix):
     from filebrowser.functions import get_version_path, version_generator
     version_path = get_version_path(image_path, version_suffix)
@@ -379,11 +630,15 @@ def mail_managers(subject, message, fail_silently=False, connection=None,
                   html_message=None):
     """
     Sends a message to the managers, as defined by the MANAGERS setting and
-    to the users in managers group."""
+    to the users in managers group. The message is queued unless a connection
+    is given."""
 
     emails = _get_managers_mails()
     if not emails:
         return
+    if connection is None:
+        from cyclope import mail_queue
+        connection = mail_queue.get_connection()
     mail = EmailMultiAlternatives(u'%s%s' % (settings.EMAIL_SUBJECT_PREFIX, subject),
                 message, settings.SERVER_EMAIL, emails, connection=connection)
     if html_message:
@@ -391,6 +646,36 @@ def mail_managers(subject, message, fail_silently=False, connection=None,
     mail.send(fail_silently=fail_silently)
 
 
+def get_tree_children(nodes):
+    """
+    Groups MPTT nodes, given in tree order, by the id of their parent. Used
+    to walk a tree loaded with a single query.
+    """
+    children = defaultdict(list)
+    for node in nodes:
+        children[node.parent_id].append(node)
+    return children
+
+def annotate_has_content(categories):
+    """Annotates the number of categorizations of each category."""
+    return categories.annotate(content_count=Count('categorizations'))
+
+_category_link_template = None
+
+def _get_category_link_template():
+    global _category_link_template
+    if _category_link_template is None:
+        _category_link_template = Template(
+            '{% if has_content %}'
+            '<span><a href="{% url category-teaser_list slug %}">{{ name }}</a></span>'
+            '{% else %} {{ name }}'
+            '{% endif %}'
+            ' <a href="{% url category_feed slug %}">'
+            '<img src="{{ media_url }}images/css/rss_logo.png"/></a>'
+            )
+    return _category_link_template
+
+
 class HyerarchyBuilderMixin(object):
 
     template_item = ""
@@ -401,26 +686,41 @@ class HyerarchyBuilderMixin(object):
         """
         raise NotImplementedError
 
+    def item_classes(self, object_, current_url=None):
+        """Returns the css classes of an item in the bootstrap nested list."""
+        from cyclope.models import MenuItem
+        classes = [object_.slug]
+        if object_.get_descendant_count():
+            classes.append('has_children dropdown')
+        else:
+            classes.append('no_children')
+        if type(object_) == MenuItem:
+            if object_.url == current_url:
+                classes.append('active')
+            if object_.site_home:
+                classes.append('site_home')
+        return " ".join(classes)
+
     def make_nested_list(self, base, bootstrap=False, *render_args):
         # optional bootstrap param to add css classes for nested dropdowns
-        from cyclope.models import MenuItem
-        def _classes(object_, current_url=None):
-            classes = [object_.slug]
-            if object_.get_descendant_count():
-                classes.append('has_children dropdown')
-            else:
-                classes.append('no_children')
-            if type(object_) == MenuItem:
-                if object_.url == current_url:
-                    classes.append('active')
-                if object_.site_home:
-                    classes.append('site_home')
-            return " ".join(classes)
+        children = get_tree_children(base.get_descendants().filter(active=True))
+        return self.make_nested_list_from_tree(base, children, bootstrap,
+                                               *render_args)
 
+    def make_nested_list_from_tree(self, base, children, bootstrap=False,
+                                   *render_args):
+        """
+        Like make_nested_list, but takes the active nodes of the tree already
+        grouped by get_tree_children.
+        """
+        _classes = self.item_classes
         nested_list = []
-        for child in base.get_children().filter(active=True):
+        for child in children.get(base.pk, []):
+            if not child.active:
+                continue
             if child.get_descendant_count() > 0:
-                nested_list.extend(self.make_nested_list(child, bootstrap, *render_args))
+                nested_list.extend(self.make_nested_list_from_tree(
+                    child, children, bootstrap, *render_args))
             else:
                 if bootstrap :
                     x = (self.render_item(child, *render_args), _classes(child, *render_args))
@@ -438,42 +738,40 @@ class HyerarchyBuilderMixin(object):
         else:
             return [include]
 
-    def _get_categories_nested_list(self, base_category, name_field='name'):
-	    """Creates a nested list to be used with unordered_list template tag
-	    """
-	    #TODO(nicoechaniz): see if there's a more efficient way to build this recursive template data.
-	    link_template = Template(
-	        '{% if has_content %}'
-	        '<span><a href="{% url category-teaser_list slug %}">{{ name }}</a></span>'
-	        '{% else %} {{ name }}'
-	        '{% endif %}'
-	        ' <a href="{% url category_feed slug %}">'
-	        '<img src="{{ media_url }}images/css/rss_logo.png"/></a>'
-	        )
-	    nested_list = []
-	    for child in base_category.get_children():
-	        if child.get_descendant_count()>0:
-	            nested_list.extend(self._get_categories_nested_list(
-	                child, name_field=name_field))
-	        else:
-	            name = getattr(child, name_field)
-	            has_content = child.categorizations.exists()
-	            nested_list.append(link_template.render(
-	                Context({'name': name,
-	                         'slug': child.slug,
-	                         'has_content': has_content,
-	                         'media_url': cyclope.settings.CYCLOPE_THEME_MEDIA_URL,})))
-
-
-	    name = getattr(base_category, name_field)
-	    has_content = base_category.categorizations.exists()
-	    include = link_template.render(
-	        Context({'name': name,
-	                 'slug': base_category.slug,
-	                 'has_content': has_content,
-	                 'has_children': base_category.get_descendant_count(),
-	                 'media_url':cyclope.settings.CYCLOPE_THEME_MEDIA_URL,}))
-	    if nested_list:
-	        return [include, nested_list]
-	    else:
-	        return [include]
+    def _get_categories_nested_list(self, base_category, name_field='name',
+                                    children=None):
+        """Creates a nested list to be used with unordered_list template tag.
+
+        children are the categories of the tree grouped by get_tree_children
+        and annotated by annotate_has_content, they are loaded when missing.
+        """
+        if children is None:
+            from cyclope.core.collections.models import Category
+            nodes = list(annotate_has_content(Category.tree.filter(
+                tree_id=base_category.tree_id, lft__gte=base_category.lft,
+                rght__lte=base_category.rght)).order_by('lft'))
+            children = get_tree_children(nodes)
+            base_category = nodes[0]
+        link_template = _get_category_link_template()
+
+        def _render(category):
+            return link_template.render(
+                Context({'name': getattr(category, name_field),
+                         'slug': category.slug,
+                         'has_content': getattr(category, 'content_count', 0) > 0,
+                         'has_children': category.get_descendant_count(),
+                         'media_url': cyclope.settings.CYCLOPE_THEME_MEDIA_URL,}))
+
+        nested_list = []
+        for child in children.get(base_category.pk, []):
+            if child.get_descendant_count()>0:
+                nested_list.extend(self._get_categories_nested_list(
+                    child, name_field=name_field, children=children))
+            else:
+                nested_list.append(_render(child))
+
+        include = _render(base_category)
+        if nested_list:
+            return [include, nested_list]
+        else:
+            return [include]
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# Copyright 2012-2013 Código Sur Sociedad Civil.
+# All rights reserved.
+#
+# This file is part of Cyclope.
+#
+# Cyclope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Cyclope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Markup rendering
+----------------
+
+Renders texts with the site's text style. The results are cached in a small
+per process LRU in front of the shared Django cache, keyed by a digest of the
+text and the style.
+
+Rendering can run in a pool of worker processes (CYCLOPE_MARKUP_PROCESSES),
+so a text that makes the renderer hang can be stopped from any thread by
+killing its worker. By default it runs in the calling process, as forking
+from threaded web servers isn't safe.
+"""
+
+import sys
+import time
+import hashlib
+import threading
+from multiprocessing import Pool, TimeoutError
+
+from django.core.cache import cache
+from django.db import models
+from django.utils.encoding import smart_str
+from django.utils.safestring import mark_safe
+from django.contrib.markup.templatetags import markup
+
+import cyclope.settings as cyc_settings
+from cyclope.utils import nohang
+from cyclope.utils.lru_cache import LRULimitedSizeDict
+
+MARKUP_RENDERER_WAIT = 5
+MARKUP_CACHE_SIZE = 250
+
+STYLES = {"wysiwyg": mark_safe,
+          "markdown": markup.markdown,
+          "textile": markup.textile,
+          "raw": mark_safe}
+
+lru_cache = LRULimitedSizeDict(size_limit=MARKUP_CACHE_SIZE)
+_lru_lock = threading.Lock()
+
+
+class MarkupRenderer(object):
+    """
+    Runs renderers in a pool of processes, each one replaced after
+    max_renders renders. When a render takes longer than wait the pool is
+    replaced by a new one on the next render, and the old one is killed once
+    the renders other threads had already sent to it are done.
+
+    Without processes the renderers run in the calling process and the wait
+    is only enforced in the main thread.
+    """
+    def __init__(self, processes, max_renders=None):
+        self.processes = processes
+        self.max_renders = max_renders
+        self._pool = None
+        # renders waiting for each pool
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.stats = {'renders': 0, 'timeouts': 0, 'errors': 0,
+                      'restarts': 0, 'render_time': 0.0}
+
+    def _acquire_pool(self):
+        with self._lock:
+            if self._pool is None:
+                kwargs = {}
+                # maxtasksperchild is new in python 2.7
+                if self.max_renders and sys.version_info >= (2, 7):
+                    kwargs['maxtasksperchild'] = self.max_renders
+                self._pool = Pool(self.processes, **kwargs)
+            pool = self._pool
+            self._pending[pool] = self._pending.get(pool, 0) + 1
+            return pool
+
+    def _release_pool(self, pool):
+        with self._lock:
+            self._pending[pool] -= 1
+            retired = pool is not self._pool and not self._pending[pool]
+            if retired:
+                del self._pending[pool]
+        if retired:
+            # the last render waiting for a replaced pool kills its workers
+            pool.terminate()
+
+    def _replace_pool(self, pool):
+        with self._lock:
+            # another thread may have replaced it already
+            if self._pool is not pool:
+                return
+            self._pool = None
+            self.stats['restarts'] += 1
+        pool.close()
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self.stats[name] += value
+
+    def run(self, renderer, value, wait):
+        """
+        Returns a tuple with the result of renderer(value) and success, which
+        is False if the renderer failed or didn't finish in wait seconds.
+        """
+        start = time.time()
+        if not self.processes:
+            result, success = nohang.run(renderer, args=(value,), wait=wait)
+            if not success:
+                self._count('timeouts')
+        else:
+            pool = self._acquire_pool()
+            result, success = None, False
+            try:
+                result, success = pool.apply_async(renderer, (value,)).get(wait), True
+            except TimeoutError:
+                self._count('timeouts')
+                self._replace_pool(pool)
+            except Exception:
+                self._count('errors')
+            finally:
+                self._release_pool(pool)
+        self._count('renders')
+        self._count('render_time', time.time() - start)
+        return result, success
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+
+renderer_service = MarkupRenderer(cyc_settings.CYCLOPE_MARKUP_PROCESSES,
+                                  cyc_settings.CYCLOPE_MARKUP_MAX_RENDERS)
+
+def _cache_key(value, style):
+    return 'cyclope_markup_%s_%s' % (style, hashlib.sha1(smart_str(value)).hexdigest())
+
+def _render(value, style):
+    renderer = STYLES.get(style, None)
+    if renderer is None:
+        raise ValueError("Bad TEXT_STYLE option: %s" % style)
+    result, success = renderer_service.run(renderer, value, MARKUP_RENDERER_WAIT)
+    if not success:
+        result = value
+    return result
+
+def render_markup(value, style=None):
+    """
+    Returns value rendered with style, by default CYCLOPE_TEXT_STYLE. If the
+    rendering takes too long value is returned unchanged.
+    """
+    style = style or cyc_settings.CYCLOPE_TEXT_STYLE
+    key = _cache_key(value, style)
+    with _lru_lock:
+        result = lru_cache[key] if key in lru_cache else None
+    if result is not None:
+        return result
+
+    result = cache.get(key)
+    if result is None:
+        result = _render(value, style)
+        cache.set(key, result, cyc_settings.CYCLOPE_MARKUP_CACHE_TIMEOUT)
+    with _lru_lock:
+        lru_cache[key] = result
+    return result
+
+def prerender(instance, style=None):
+    """Renders and caches the text fields of a model instance."""
+    for field in instance._meta.fields:
+        if isinstance(field, models.TextField):
+            value = getattr(instance, field.attname)
+            if value:
+                render_markup(value, style)